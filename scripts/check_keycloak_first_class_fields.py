@@ -2,6 +2,8 @@
 """Validate that the Keycloak CR only uses strongly typed fields for first-class options."""
 from __future__ import annotations
 
+import mmap
+import os
 import re
 import sys
 from pathlib import Path
@@ -10,35 +12,69 @@ REPO_ROOT = Path(__file__).resolve().parents[1]
 MANIFEST = REPO_ROOT / "gitops/apps/iam/keycloak/keycloak.yaml"
 
 BANNED_ADDITIONAL_OPTIONS = {
-    re.compile(r"^\s*-?\s*name:\s*db-url\s*$", re.MULTILINE): "--db-url",
-    re.compile(r"^\s*-?\s*name:\s*hostname-strict\s*$", re.MULTILINE): "--hostname-strict",
-    re.compile(r"^\s*-?\s*name:\s*hostname-strict-https\s*$", re.MULTILINE): "--hostname-strict-https",
-    re.compile(r"^\s*-?\s*name:\s*features\s*$", re.MULTILINE): "--features",
+    "db-url": "--db-url",
+    "hostname-strict": "--hostname-strict",
+    "hostname-strict-https": "--hostname-strict-https",
+    "features": "--features",
 }
+BANNED_RE = re.compile(
+    rb"^\s*-?\s*name:\s*(?P<option>"
+    + b"|".join(re.escape(option.encode("ascii")) for option in BANNED_ADDITIONAL_OPTIONS)
+    + rb")\s*$",
+    re.MULTILINE,
+)
 
 
 def main() -> int:
-    text = MANIFEST.read_text(encoding="utf-8")
+    with open(MANIFEST, "rb") as handle:
+        if os.fstat(handle.fileno()).st_size == 0:
+            return _check(b"")
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as manifest:
+            return _check(manifest)
+
+
+def _iter_lines(manifest: bytes | mmap.mmap):
+    """Yield manifest lines without materialising a decoded copy of the file."""
+
+    if isinstance(manifest, bytes):
+        yield from manifest.splitlines()
+        return
+    manifest.seek(0)
+    yield from iter(manifest.readline, b"")
+
+
+def _check(manifest: bytes | mmap.mmap) -> int:
     errors: list[str] = []
 
-    for pattern, flag in BANNED_ADDITIONAL_OPTIONS.items():
-        if pattern.search(text):
+    reported: set[str] = set()
+    for match in BANNED_RE.finditer(manifest):
+        option = match.group("option").decode("ascii")
+        if option in reported:
+            continue
+        reported.add(option)
+        errors.append(
+            "Keycloak manifest must not configure "
+            f"{BANNED_ADDITIONAL_OPTIONS[option]} via additionalOptions (name '{option}')."
+        )
+
+    found_db_block = False
+    in_db_block = False
+    for line in _iter_lines(manifest):
+        if not in_db_block:
+            if line.rstrip() == b"  db:":
+                found_db_block = in_db_block = True
+            continue
+        if not line.strip():
+            continue
+        if not line.startswith((b"    ", b"\t")):
+            break
+        if line.strip().startswith(b"url:"):
             errors.append(
-                "Keycloak manifest must not configure "
-                f"{flag} via additionalOptions (pattern '{pattern.pattern}')."
+                "Keycloak manifest must drive the database connection through typed host/port/database fields instead of spec.db.url."
             )
+            break
 
-    db_block_match = re.search(r"^  db:\n(?P<body>(?:^(?: {4}|\t).*(?:\n|$))*)", text, re.MULTILINE)
-    if db_block_match:
-        body = db_block_match.group("body")
-        for line in body.splitlines():
-            stripped = line.strip()
-            if stripped.startswith("url:"):
-                errors.append(
-                    "Keycloak manifest must drive the database connection through typed host/port/database fields instead of spec.db.url."
-                )
-                break
-    else:
+    if not found_db_block:
         errors.append("Unable to locate spec.db block in Keycloak manifest; update the checker if the manifest moved.")
 
     if errors:
@@ -5,11 +5,14 @@ from __future__ import annotations
 import argparse
 import contextlib
 import ipaddress
+import json
+import mmap
 import os
 import re
 import socket
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Iterable, Optional
@@ -24,6 +27,20 @@ DEFAULT_MANIFEST_FILES = [
     Path("gitops/clusters/aks/bootstrap/argocd-ingress.yaml"),
 ]
 DEFAULT_VALIDATION_PATHS = [Path("gitops")]
+# Only text formats that can carry hostnames are scanned when walking directories.
+VALIDATION_SUFFIXES = frozenset(
+    {".env", ".json", ".md", ".sh", ".tf", ".txt", ".xml", ".yaml", ".yml"}
+)
+PARAMS_HEADER = (
+    "# Ingress parameters for the IAM demo environment.\n"
+    "# Hosts rotate via scripts/configure_demo_hosts.py; update ingressClass here if\n"
+    "# your cluster uses a different controller.\n"
+)
+HOST_RE = re.compile(
+    rb"\b(?P<service>kc|mp|argocd)\."
+    rb"(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\.nip\.io\b"
+)
+HOST_SUB_RE = re.compile(r"(?P<service>kc|mp|argocd)\.\d+\.\d+\.\d+\.\d+\.nip\.io")
 
 
 @dataclass
@@ -37,8 +54,8 @@ class KubectlError(RuntimeError):
     """Raised when kubectl returns a non-zero exit status."""
 
 
-def _format_kubectl_resource(service: str) -> tuple[str, str]:
-    """Return the namespace and resource reference for kubectl."""
+def parse_ingress_service(service: str) -> tuple[str, str]:
+    """Split an ingress service reference into its namespace and kubectl resource."""
 
     parts = service.split("/")
     if len(parts) == 2:
@@ -55,10 +72,8 @@ def _format_kubectl_resource(service: str) -> tuple[str, str]:
     return namespace, resource
 
 
-def run_kubectl_jsonpath(service: str, jsonpath: str) -> str:
-    """Return the kubectl jsonpath result or raise KubectlError."""
-    namespace, resource = _format_kubectl_resource(service)
-    cmd = ["kubectl", "-n", namespace, "get", resource, "-o", f"jsonpath={jsonpath}"]
+def _run_kubectl(cmd: list[str]) -> str:
+    """Run *cmd* and return its stdout or raise KubectlError."""
     proc = subprocess.run(cmd, check=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
     if proc.returncode != 0:
         stderr = proc.stderr.strip()
@@ -71,15 +86,59 @@ def run_kubectl_jsonpath(service: str, jsonpath: str) -> str:
         if stdout:
             details.append(f"stdout: {stdout}")
         raise KubectlError(" ".join(details))
-    return proc.stdout.strip()
+    return proc.stdout
+
+
+def run_kubectl_jsonpath(service: str, jsonpath: str) -> str:
+    """Return the kubectl jsonpath result or raise KubectlError."""
+    namespace, resource = parse_ingress_service(service)
+    cmd = ["kubectl", "-n", namespace, "get", resource, "-o", f"jsonpath={jsonpath}"]
+    return _run_kubectl(cmd).strip()
+
+
+def run_kubectl_json(service: str) -> dict:
+    """Return the full resource definition as a dictionary or raise KubectlError."""
+    namespace, resource = parse_ingress_service(service)
+    cmd = ["kubectl", "-n", namespace, "get", resource, "-o", "json"]
+    return json.loads(_run_kubectl(cmd) or "{}")
+
+
+def _is_public_address(ip_obj: ipaddress.IPv4Address | ipaddress.IPv6Address) -> bool:
+    """Return ``True`` if *ip_obj* can serve as an externally reachable ingress address."""
+    return not (
+        ip_obj.is_private
+        or ip_obj.is_loopback
+        or ip_obj.is_link_local
+        or ip_obj.is_multicast
+        or ip_obj.is_unspecified
+    )
 
 
-def _split_candidates(raw: str) -> list[str]:
-    """Return non-empty values from a kubectl jsonpath string."""
+def _resolve_hostname(hostname: str) -> str:
+    """Resolve *hostname* to an IPv4 address, preferring public ones, or raise OSError.
 
-    if not raw:
-        return []
-    return [value for value in re.split(r"[\s,]+", raw.strip()) if value]
+    nip.io hostnames (and HOST_RE) only embed IPv4 addresses, so IPv6 results are
+    never returned; a name without A records raises so the next candidate is tried.
+    """
+    try:
+        literal = ipaddress.ip_address(hostname)
+    except ValueError:
+        pass
+    else:
+        if literal.version != 4:
+            raise OSError(f"{hostname} is not an IPv4 address")
+        return str(literal)
+
+    addresses = [
+        ipaddress.IPv4Address(sockaddr[0])
+        for family, *_, sockaddr in socket.getaddrinfo(
+            hostname, None, family=socket.AF_INET, proto=socket.IPPROTO_TCP
+        )
+        if family == socket.AF_INET
+    ]
+    if not addresses:
+        raise OSError(f"{hostname} did not resolve to any IPv4 address")
+    return str(min(addresses, key=lambda address: not _is_public_address(address)))
 
 
 def resolve_ingress_ip(service: str, explicit_ip: Optional[str], explicit_hostname: Optional[str]) -> str:
@@ -88,14 +147,23 @@ def resolve_ingress_ip(service: str, explicit_ip: Optional[str], explicit_hostna
         ipaddress.ip_address(explicit_ip)  # validate format
         return explicit_ip
 
+    query_error: Optional[KubectlError] = None
     try:
-        ip_values = run_kubectl_jsonpath(service, "{.status.loadBalancer.ingress[*].ip}")
-    except KubectlError:
-        ip_values = ""
+        resource = run_kubectl_json(service)
+    except KubectlError as exc:
+        resource = {}
+        query_error = exc
 
-    for candidate in reversed(_split_candidates(ip_values)):
+    load_balancer = (resource.get("status") or {}).get("loadBalancer") or {}
+    ingress_entries = [entry for entry in load_balancer.get("ingress") or [] if isinstance(entry, dict)]
+
+    for entry in reversed(ingress_entries):
+        candidate = entry.get("ip")
+        if not candidate:
+            continue
         try:
-            ipaddress.ip_address(candidate)
+            if ipaddress.ip_address(candidate).version != 4:
+                continue
         except ValueError:
             continue
         return candidate
@@ -103,36 +171,25 @@ def resolve_ingress_ip(service: str, explicit_ip: Optional[str], explicit_hostna
     hostname_candidates: list[str] = []
     if explicit_hostname:
         hostname_candidates.append(explicit_hostname)
+    hostname_candidates.extend(entry["hostname"] for entry in ingress_entries if entry.get("hostname"))
 
-    try:
-        hostname_values = run_kubectl_jsonpath(service, "{.status.loadBalancer.ingress[*].hostname}")
-    except KubectlError:
-        hostname_values = ""
-
-    hostname_candidates.extend(_split_candidates(hostname_values))
-
-    for hostname in hostname_candidates:
+    # Successful lookups return immediately, so only failures could repeat; resolve
+    # each distinct hostname once.
+    for hostname in dict.fromkeys(hostname_candidates):
         try:
-            return socket.gethostbyname(hostname)
+            return _resolve_hostname(hostname)
         except OSError:
             continue
 
     status_hint = ""
-    try:
-        svc_type = run_kubectl_jsonpath(service, "{.spec.type}")
-    except KubectlError as exc:
-        svc_type = ""
-        status_hint = f" Unable to query service type: {exc}."
-    try:
-        lb_state = run_kubectl_jsonpath(service, "{.status.loadBalancer}")
-    except KubectlError as exc:
-        lb_state = ""
-        status_hint = f"{status_hint} Unable to query load balancer status: {exc}."
+    if query_error is not None:
+        status_hint = f" Unable to query ingress service: {query_error}."
     else:
-        if lb_state:
-            status_hint = f"{status_hint} Current loadBalancer status: {lb_state}."
-    if svc_type:
-        status_hint = f"{status_hint} Service type: {svc_type}."
+        if load_balancer:
+            status_hint = f" Current loadBalancer status: {json.dumps(load_balancer)}."
+        svc_type = (resource.get("spec") or {}).get("type")
+        if svc_type:
+            status_hint = f"{status_hint} Service type: {svc_type}."
     raise RuntimeError(
         "Ingress controller does not expose an external IP or hostname yet. "
         "Provide --ingress-ip or wait for the service to publish an address." + status_hint
@@ -142,26 +199,31 @@ def resolve_ingress_ip(service: str, explicit_ip: Optional[str], explicit_hostna
 def build_hosts(ip: str) -> Hosts:
     """Return nip.io hosts for the provided IP address."""
     ipaddress.ip_address(ip)
+    suffix = f".{ip}.nip.io"
     return Hosts(
-        keycloak=f"kc.{ip}.nip.io",
-        midpoint=f"mp.{ip}.nip.io",
-        argocd=f"argocd.{ip}.nip.io",
+        keycloak="kc" + suffix,
+        midpoint="mp" + suffix,
+        argocd="argocd" + suffix,
     )
 
 
+def _probe_port(ip: str, port: int) -> Optional[OSError]:
+    """Return ``None`` if *ip* accepts TCP connections on *port*, else the error."""
+
+    try:
+        with contextlib.closing(socket.create_connection((ip, port), timeout=5)):
+            return None
+    except OSError as exc:
+        return exc
+
+
 def ensure_ingress_accessible(
     ip: str, *, ports: Iterable[int] = (80, 443), raise_on_error: bool = True
 ) -> None:
     """Validate the ingress endpoint resolves to a reachable public address."""
 
     ip_obj = ipaddress.ip_address(ip)
-    if (
-        ip_obj.is_private
-        or ip_obj.is_loopback
-        or ip_obj.is_link_local
-        or ip_obj.is_multicast
-        or ip_obj.is_unspecified
-    ):
+    if not _is_public_address(ip_obj):
         message = (
             "Ingress controller resolved to a non-public IP address"
             f" ({ip_obj}). Ensure the service publishes an external address or"
@@ -172,21 +234,26 @@ def ensure_ingress_accessible(
         print(f"WARNING: {message}", file=sys.stderr)
         return
 
+    ports = tuple(ports)
     connection_errors: dict[int, Exception] = {}
-    for port in ports:
-        try:
-            with contextlib.closing(
-                socket.create_connection((str(ip_obj), port), timeout=5)
-            ):
+    executor = ThreadPoolExecutor(max_workers=max(1, len(ports)))
+    try:
+        futures = {executor.submit(_probe_port, str(ip_obj), port): port for port in ports}
+        for future in as_completed(futures):
+            port = futures[future]
+            error = future.result()
+            if error is None:
                 print(
                     f"✅ Verified ingress load balancer {ip_obj} accepts TCP connections on port {port}",
                     flush=True,
                 )
                 return
-        except OSError as exc:
-            connection_errors[port] = exc
+            connection_errors[port] = error
+    finally:
+        # Do not block on the remaining probes once one port has answered.
+        executor.shutdown(wait=False, cancel_futures=True)
 
-    joined_errors = "; ".join(f"{port}/tcp: {err}" for port, err in connection_errors.items())
+    joined_errors = "; ".join(f"{port}/tcp: {connection_errors[port]}" for port in ports)
     message = (
         "Unable to reach the ingress load balancer at"
         f" {ip_obj}; attempted ports {', '.join(str(p) for p in ports)}."
@@ -202,29 +269,25 @@ def ensure_ingress_accessible(
 def read_ingress_class(params_file: Path) -> Optional[str]:
     if not params_file.exists():
         return None
-    for line in params_file.read_text(encoding="utf-8").splitlines():
-        if line.startswith("ingressClass="):
-            return line.split("=", 1)[1].strip()
+    with params_file.open(encoding="utf-8") as handle:
+        for line in handle:
+            if line.startswith("ingressClass="):
+                return line.split("=", 1)[1].strip()
     return None
 
 
 def write_params(params_file: Path, ingress_class: str, hosts: Hosts) -> None:
+    content = (
+        f"{PARAMS_HEADER}"
+        f"ingressClass={ingress_class}\n"
+        f"keycloakHost={hosts.keycloak}\n"
+        f"midpointHost={hosts.midpoint}\n"
+        f"argocdHost={hosts.argocd}\n"
+    ).encode("utf-8")
+    if params_file.is_file() and params_file.read_bytes() == content:
+        return
     params_file.parent.mkdir(parents=True, exist_ok=True)
-    params_file.write_text(
-        "\n".join(
-            [
-                "# Ingress parameters for the IAM demo environment.",
-                "# Hosts rotate via scripts/configure_demo_hosts.py; update ingressClass here if",
-                "# your cluster uses a different controller.",
-                f"ingressClass={ingress_class}",
-                f"keycloakHost={hosts.keycloak}",
-                f"midpointHost={hosts.midpoint}",
-                f"argocdHost={hosts.argocd}",
-            ]
-        )
-        + "\n",
-        encoding="utf-8",
-    )
+    params_file.write_bytes(content)
 
 
 def iter_environment_lines(ip_address: str, hosts: Hosts) -> Iterable[str]:
@@ -239,11 +302,7 @@ def iter_environment_lines(ip_address: str, hosts: Hosts) -> Iterable[str]:
 def update_manifest_hosts(manifest_files: Iterable[Path], hosts: Hosts) -> None:
     """Update nip.io host references within manifest files."""
 
-    replacements = [
-        (re.compile(r"kc\.\d+\.\d+\.\d+\.\d+\.nip\.io"), hosts.keycloak),
-        (re.compile(r"mp\.\d+\.\d+\.\d+\.\d+\.nip\.io"), hosts.midpoint),
-        (re.compile(r"argocd\.\d+\.\d+\.\d+\.\d+\.nip\.io"), hosts.argocd),
-    ]
+    replacements = {"kc": hosts.keycloak, "mp": hosts.midpoint, "argocd": hosts.argocd}
 
     for manifest in manifest_files:
         if not manifest:
@@ -251,41 +310,62 @@ def update_manifest_hosts(manifest_files: Iterable[Path], hosts: Hosts) -> None:
         if not manifest.exists():
             continue
         original_content = manifest.read_text(encoding="utf-8")
-        updated_content = original_content
-        for pattern, replacement in replacements:
-            updated_content = pattern.sub(replacement, updated_content)
+        updated_content = HOST_SUB_RE.sub(
+            lambda match: replacements[match.group("service")], original_content
+        )
         if updated_content != original_content:
             manifest.write_text(updated_content, encoding="utf-8")
 
 
+def _iter_text_files(root: Path) -> Iterable[Path]:
+    """Yield regular text files below *root*, skipping hidden directories and other suffixes."""
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() not in VALIDATION_SUFFIXES:
+                continue
+            path = os.path.join(dirpath, filename)
+            # Broken symlinks and special files cannot be scanned.
+            if os.path.isfile(path):
+                yield Path(path)
+
+
+def _scan_file(candidate: Path, expected_ip: bytes) -> list[tuple[Path, str]]:
+    """Return stale nip.io references found in a single file."""
+
+    with open(candidate, "rb") as handle:
+        if os.fstat(handle.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as contents:
+            if contents.find(b"nip.io") == -1:
+                return []
+            return [
+                (candidate, match.group(0).decode("ascii"))
+                for match in HOST_RE.finditer(contents)
+                if match.group("ip") != expected_ip
+            ]
+
+
 def discover_stale_hosts(paths: Iterable[Path], expected_ip: str) -> list[tuple[Path, str]]:
     """Return references to nip.io hosts that do not match the expected IP."""
 
-    host_pattern = re.compile(
-        r"\b(?P<service>kc|mp|argocd)\."
-        r"(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\.nip\.io\b"
-    )
-    stale: list[tuple[Path, str]] = []
-
+    candidates: list[Path] = []
     for raw_path in paths:
         if not raw_path:
             continue
         path = raw_path.resolve()
         if path.is_dir():
-            candidates = (p for p in path.rglob("*") if p.is_file())
+            candidates.extend(_iter_text_files(path))
         elif path.is_file():
-            candidates = [path]
-        else:
-            continue
+            candidates.append(path)
 
-        for candidate in candidates:
-            try:
-                contents = candidate.read_text(encoding="utf-8")
-            except UnicodeDecodeError:
-                contents = candidate.read_text(encoding="utf-8", errors="ignore")
-            for match in host_pattern.finditer(contents):
-                if match.group("ip") != expected_ip:
-                    stale.append((candidate, match.group(0)))
+    expected = expected_ip.encode("ascii")
+    stale: list[tuple[Path, str]] = []
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for references in executor.map(lambda candidate: _scan_file(candidate, expected), candidates):
+            stale.extend(references)
 
     return stale
 
@@ -304,7 +384,7 @@ def ensure_hosts_rotated(paths: Iterable[Path], expected_ip: str) -> None:
         )
 
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv: Optional[Iterable[str]] = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument(
         "--params-file",
@@ -368,11 +448,11 @@ def parse_args() -> argparse.Namespace:
         type=Path,
         help="Write KEY=VALUE environment variable assignments to this file",
     )
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
-def main() -> int:
-    args = parse_args()
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    args = parse_args(argv)
     ingress_class = args.ingress_class or read_ingress_class(args.params_file) or "nginx"
 
     ip_value = resolve_ingress_ip(args.ingress_service, args.ingress_ip, args.ingress_hostname)
@@ -383,17 +463,12 @@ def main() -> int:
     )
     hosts = build_hosts(ip_value)
 
-    env_lines = [
-        f"EXTERNAL_IP={ip_value}",
-        f"KC_HOST={hosts.keycloak}",
-        f"MP_HOST={hosts.midpoint}",
-        f"ARGOCD_HOST={hosts.argocd}",
-    ]
+    env_payload = "".join(f"{line}\n" for line in iter_environment_lines(ip_value, hosts))
 
     env_file_path: Optional[Path] = getattr(args, "env_file", None)
     if env_file_path:
         env_file_path.parent.mkdir(parents=True, exist_ok=True)
-        env_file_path.write_text("\n".join(env_lines) + "\n", encoding="utf-8")
+        env_file_path.write_text(env_payload, encoding="utf-8")
 
     if args.print_only:
         print(hosts.keycloak)
@@ -402,11 +477,14 @@ def main() -> int:
         return 0
 
     write_params(args.params_file, ingress_class, hosts)
+    written_params = {args.params_file.resolve()}
     for extra_file in args.extra_params_file:
         if not extra_file:
             continue
-        if extra_file.resolve() == args.params_file.resolve():
+        extra_resolved = extra_file.resolve()
+        if extra_resolved in written_params:
             continue
+        written_params.add(extra_resolved)
         write_params(extra_file, ingress_class, hosts)
 
     manifest_files = getattr(args, "manifest_file", DEFAULT_MANIFEST_FILES)
@@ -415,26 +493,25 @@ def main() -> int:
     validation_paths = getattr(args, "validation_path", DEFAULT_VALIDATION_PATHS)
     ensure_hosts_rotated(validation_paths, ip_value)
 
-    env_lines = list(iter_environment_lines(ip_value, hosts))
-    for line in env_lines:
-        print(line)
-
-    print()
+    print(env_payload)
 
     github_env = os.environ.get("GITHUB_ENV")
     skip_env_write = os.environ.get("CONFIGURE_DEMO_HOSTS_SKIP_DIRECT_ENV", "").lower()
     if github_env and skip_env_write not in {"1", "true", "yes", "on"}:
         with open(github_env, "a", encoding="utf-8") as env_file:
-            env_file.write("\n".join(env_lines) + "\n")
+            env_file.write(env_payload)
     github_output = os.environ.get("GITHUB_OUTPUT")
     if github_output:
+        # Argo CD terminates TLS at the upstream service; the ingress itself
+        # only serves HTTP. Surface the reachable scheme so the generated
+        # URL works out of the box.
+        output_payload = (
+            f"keycloak_url=http://{hosts.keycloak}\n"
+            f"midpoint_url=http://{hosts.midpoint}/midpoint\n"
+            f"argocd_url=http://{hosts.argocd}\n"
+        )
         with open(github_output, "a", encoding="utf-8") as output_file:
-            output_file.write(f"keycloak_url=http://{hosts.keycloak}\n")
-            output_file.write(f"midpoint_url=http://{hosts.midpoint}/midpoint\n")
-            # Argo CD terminates TLS at the upstream service; the ingress itself
-            # only serves HTTP. Surface the reachable scheme so the generated
-            # URL works out of the box.
-            output_file.write(f"argocd_url=http://{hosts.argocd}\n")
+            output_file.write(output_payload)
 
     print("✅ Updated ingress host configuration:")
     print(f"   Keycloak:  http://{hosts.keycloak}")
@@ -3,14 +3,18 @@
 
 from __future__ import annotations
 
-import argparse
+import csv
+import io
 import json
 import os
+import shutil
 import subprocess
 import sys
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Iterable, Optional
+from typing import TYPE_CHECKING, Iterable, Optional
 from pathlib import Path
 
 if __package__ in (None, ""):
@@ -20,22 +24,70 @@ if __package__ in (None, ""):
     if str(repo_root) not in sys.path:
         sys.path.insert(0, str(repo_root))
 
-from scripts.configure_demo_hosts import DEFAULT_SERVICE, KubectlError, run_kubectl_jsonpath
+from scripts.configure_demo_hosts import (
+    DEFAULT_SERVICE,
+    KubectlError,
+    parse_ingress_service,
+    run_kubectl_jsonpath,
+)
+
+if TYPE_CHECKING:
+    import argparse
+
+try:  # orjson is optional; it only speeds up encoding patches and decoding kubectl output.
+    import orjson
+except ImportError:  # pragma: no cover - depends on the local environment
+    orjson = None
+
+
+# Renders "<ip>|<hostname>" for the first published load balancer ingress entry.
+LOAD_BALANCER_ADDRESS_JSONPATH = (
+    "{.status.loadBalancer.ingress[0].ip}|{.status.loadBalancer.ingress[0].hostname}"
+)
 
 
 class AzureCliError(RuntimeError):
     """Raised when the Azure CLI exits with a non-zero status."""
 
 
+def _json_dumps(value: object) -> str:
+    """Serialise *value* compactly, using orjson when it is installed."""
+
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value, separators=(",", ":"))
+
+
+def _json_loads(payload: bytes | str) -> object:
+    """Parse a JSON document, using orjson when it is installed."""
+
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def _spawn_argv(cmd: list[str]) -> list[str]:
+    """Return *cmd* with an absolute executable path.
+
+    An absolute executable, a non-inherited stdin and ``close_fds=False`` let
+    CPython launch the child with posix_spawn instead of fork+exec.
+    """
+
+    return [shutil.which(cmd[0]) or cmd[0], *cmd[1:]]
+
+
 def _run_command(cmd: Iterable[str], *, check: bool = True) -> subprocess.CompletedProcess[str]:
     """Execute *cmd* and optionally raise if it fails."""
 
+    cmd = list(cmd)
     proc = subprocess.run(
-        list(cmd),
+        _spawn_argv(cmd),
         check=False,
+        stdin=subprocess.DEVNULL,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         text=True,
+        close_fds=False,
     )
     if check and proc.returncode != 0:
         raise RuntimeError(
@@ -56,34 +108,40 @@ def _run_az(cmd: Iterable[str]) -> subprocess.CompletedProcess[str]:
 def _parse_service(service: str) -> tuple[str, str]:
     """Return the namespace and name components of an ingress service reference."""
 
-    parts = service.split("/")
-    if len(parts) == 2:
-        namespace, name = parts
-    elif len(parts) == 3:
-        namespace, _resource_type, name = parts
-    else:  # pragma: no cover - validated by CLI contract
-        raise ValueError(
-            "--ingress-service must be <namespace>/<name> or <namespace>/<resource>/<name>"
-        )
-    return namespace, name
+    namespace, resource = parse_ingress_service(service)
+    return namespace, resource.partition("/")[2]
 
 
 def _kubectl_json(namespace: str, name: str) -> dict:
     """Return the Kubernetes service definition as a dictionary."""
 
-    proc = _run_command(
-        ["kubectl", "-n", namespace, "get", f"service/{name}", "-o", "json"],
-        check=False,
-    )
-    if proc.returncode != 0:
-        raise KubectlError(proc.stderr.strip() or "kubectl command failed")
-    return json.loads(proc.stdout)
+    cmd = ["kubectl", "-n", namespace, "get", f"service/{name}", "-o", "json"]
+    # Decode the raw bytes straight from the pipe; json detects UTF-8 itself, so no
+    # intermediate str is built. stderr goes to a temporary file so a chatty kubectl
+    # cannot block on a full pipe.
+    with tempfile.TemporaryFile() as stderr_file:
+        with subprocess.Popen(
+            _spawn_argv(cmd),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=stderr_file,
+            close_fds=False,
+        ) as proc:
+            try:
+                service = _json_loads(proc.stdout.read())
+            except ValueError:
+                service = None
+        if proc.returncode != 0 or service is None:
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode(errors="replace").strip()
+            raise KubectlError(stderr or "kubectl command failed")
+    return service
 
 
 def _patch_service(namespace: str, name: str, patch: dict) -> None:
     """Apply a strategic merge patch to the service."""
 
-    payload = json.dumps(patch)
+    payload = _json_dumps(patch)
     _run_command(
         [
             "kubectl",
@@ -92,151 +150,230 @@ def _patch_service(namespace: str, name: str, patch: dict) -> None:
             "patch",
             f"service/{name}",
             "--type",
-            "merge",
+            "strategic",
+            "--field-manager",
+            "ensure-ingress-load-balancer",
             "-p",
             payload,
         ]
     )
 
 
-def _ensure_service_type(service: dict, namespace: str, name: str) -> bool:
-    """Ensure the service type is ``LoadBalancer``; return ``True`` if patched."""
+def _ensure_service_type(service: dict, namespace: str, name: str, patch: dict) -> bool:
+    """Record a ``LoadBalancer`` service type change in *patch*; return ``True`` if needed."""
 
-    if service.get("spec", {}).get("type") == "LoadBalancer":
+    current_type = (service.get("spec") or {}).get("type", "unknown")
+    if current_type == "LoadBalancer":
         return False
     print(
-        f"ℹ️  Updating {namespace}/{name} service type from"
-        f" {service.get('spec', {}).get('type', 'unknown')} to LoadBalancer",
+        f"ℹ️  Updating {namespace}/{name} service type from {current_type} to LoadBalancer",
         flush=True,
     )
-    _patch_service(namespace, name, {"spec": {"type": "LoadBalancer"}})
+    patch.setdefault("spec", {})["type"] = "LoadBalancer"
     return True
 
 
-def _ensure_annotation(service: dict, namespace: str, name: str, key: str, value: str) -> bool:
-    """Ensure the service annotation *key* equals *value*; return ``True`` if patched."""
+def _ensure_annotation(
+    service: dict, namespace: str, name: str, key: str, value: str, patch: dict
+) -> bool:
+    """Record annotation *key*=*value* in *patch* if it differs; return ``True`` if needed."""
 
-    metadata = service.setdefault("metadata", {})
-    annotations = metadata.setdefault("annotations", {})
+    annotations = (service.get("metadata") or {}).get("annotations") or {}
     if annotations.get(key) == value:
         return False
     print(
         f"ℹ️  Setting annotation {key}={value!r} on service {namespace}/{name}",
         flush=True,
     )
-    _patch_service(namespace, name, {"metadata": {"annotations": {key: value}}})
+    patch.setdefault("metadata", {}).setdefault("annotations", {})[key] = value
     return True
 
 
+def _announce_address(ip_value: str, hostname_value: str) -> bool:
+    """Print the published load balancer address; return ``False`` if there is none."""
+
+    if ip_value:
+        print(f"✅ Load balancer exposes external IP {ip_value}", flush=True)
+        return True
+    if hostname_value:
+        print(f"✅ Load balancer exposes hostname {hostname_value}", flush=True)
+        return True
+    return False
+
+
+def _report_load_balancer_address(service: str) -> bool:
+    """Query and print the published load balancer address; return ``False`` if none exists yet."""
+
+    try:
+        address = run_kubectl_jsonpath(service, LOAD_BALANCER_ADDRESS_JSONPATH)
+    except KubectlError:
+        address = ""
+    ip_value, _, hostname_value = address.partition("|")
+    return _announce_address(ip_value.strip(), hostname_value.strip())
+
+
+def _kubectl_wait_for_ingress(service: str, timeout: int) -> Optional[bool]:
+    """Block in ``kubectl wait`` until the load balancer publishes an address.
+
+    ``kubectl wait`` prints the address itself once the condition holds, so no
+    follow-up query is needed. Returns ``True`` once an address was announced,
+    ``False`` if kubectl timed out, and ``None`` if the caller should poll
+    instead (older kubectl without bare JSONPath conditions, or an ingress entry
+    without an address).
+    """
+
+    namespace, resource = parse_ingress_service(service)
+    proc = _run_command(
+        [
+            "kubectl",
+            "-n",
+            namespace,
+            "wait",
+            resource,
+            "--for=jsonpath={.status.loadBalancer.ingress}",
+            f"--timeout={timeout}s",
+            "-o",
+            f"jsonpath={LOAD_BALANCER_ADDRESS_JSONPATH}",
+        ],
+        check=False,
+    )
+    if proc.returncode == 0:
+        ip_value, _, hostname_value = proc.stdout.strip().partition("|")
+        return _announce_address(ip_value.strip(), hostname_value.strip()) or None
+    if "timed out" in proc.stderr:
+        return False
+    print(
+        f"ℹ️  kubectl wait unavailable ({proc.stderr.strip() or 'unknown error'}); polling instead",
+        flush=True,
+    )
+    return None
+
+
 def _wait_for_load_balancer(service: str, timeout: int, interval: int) -> None:
     """Wait until the service exposes an external IP or hostname."""
 
     deadline = time.monotonic() + timeout
-    while time.monotonic() < deadline:
-        try:
-            ip_value = run_kubectl_jsonpath(service, "{.status.loadBalancer.ingress[0].ip}")
-        except KubectlError:
-            ip_value = ""
-        if ip_value:
-            print(f"✅ Load balancer exposes external IP {ip_value}", flush=True)
-            return
-        try:
-            hostname_value = run_kubectl_jsonpath(
-                service, "{.status.loadBalancer.ingress[0].hostname}"
-            )
-        except KubectlError:
-            hostname_value = ""
-        if hostname_value:
-            print(f"✅ Load balancer exposes hostname {hostname_value}", flush=True)
-            return
-        time.sleep(interval)
+    waited = _kubectl_wait_for_ingress(service, timeout)
+    if waited:
+        return
+    if waited is None:
+        while True:
+            if _report_load_balancer_address(service):
+                return
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(interval)
     raise RuntimeError(
         "Timed out waiting for the ingress load balancer to publish an external IP or hostname"
     )
 
 
-def _emit_azure_diagnostics(node_resource_group: str) -> None:
-    """Surface Azure load balancer diagnostics to aid troubleshooting."""
+def _azure_diagnostic_commands(node_resource_group: str) -> tuple[tuple[str, ...], tuple[str, ...]]:
+    """Return the public IP and load balancer queries used for diagnostics.
 
-    print("::group::Azure load balancer diagnostics", flush=True)
-    try:
-        public_ip_proc = _run_az(
-            (
-                "network",
-                "public-ip",
-                "list",
-                "--resource-group",
-                node_resource_group,
-                "--query",
-                "[].{name:name, ipAddress:ipAddress, provisioningState:provisioningState}",
-                "-o",
-                "table",
-            )
-        )
-        print("📡 Public IP addresses:")
-        print(public_ip_proc.stdout.strip() or "(none)")
-    except AzureCliError as exc:
-        print(f"⚠️  Unable to list public IPs: {exc}")
+    ``az network lb list`` already embeds frontend IP configurations and rules,
+    so two ARM listings cover all four diagnostic tables. The public IP query
+    projects an ordered JMESPath list so its ``tsv`` columns are stable.
+    """
 
-    try:
-        lb_proc = _run_az(
-            (
-                "network",
-                "lb",
-                "list",
-                "--resource-group",
-                node_resource_group,
-                "--query",
-                "[].{name:name, provisioningState:provisioningState}",
-                "-o",
-                "table",
-            )
-        )
-        print("📦 Load balancers:")
-        print(lb_proc.stdout.strip() or "(none)")
-    except AzureCliError as exc:
-        print(f"⚠️  Unable to list load balancers: {exc}")
+    public_ips = (
+        "network",
+        "public-ip",
+        "list",
+        "--resource-group",
+        node_resource_group,
+        "--query",
+        "[].[name, ipAddress, provisioningState]",
+        "-o",
+        "tsv",
+    )
+    load_balancers = (
+        "network",
+        "lb",
+        "list",
+        "--resource-group",
+        node_resource_group,
+        "--query",
+        "[].{name: name, provisioningState: provisioningState,"
+        " frontends: frontendIPConfigurations[].[name, privateIPAddress, publicIPAddress.id, provisioningState],"
+        " rules: loadBalancingRules[].[name, protocol, frontendPort, backendPort, provisioningState]}",
+        "-o",
+        "json",
+    )
+    return public_ips, load_balancers
 
-    try:
-        rules_proc = _run_az(
-            (
-                "network",
-                "lb",
-                "frontend-ip",
-                "list",
-                "--resource-group",
-                node_resource_group,
-                "--lb-name",
-                "kubernetes",
-                "-o",
-                "table",
-            )
-        )
-        print("🔀 Frontend IP configurations (kubernetes LB):")
-        print(rules_proc.stdout.strip() or "(none)")
-    except AzureCliError as exc:
-        print(f"⚠️  Unable to inspect kubernetes load balancer frontends: {exc}")
+
+def _format_table(rows: list[list[str]], headers: Iterable[str]) -> str:
+    """Render *rows* as a left-aligned text table in the style of ``az -o table``."""
+
+    headers = list(headers)
+    widths = [len(header) for header in headers]
+    for row in rows:
+        for index, cell in enumerate(row[: len(widths)]):
+            widths[index] = max(widths[index], len(cell))
+    lines = [
+        "  ".join(header.ljust(width) for header, width in zip(headers, widths)).rstrip(),
+        "  ".join("-" * width for width in widths),
+    ]
+    for row in rows:
+        lines.append("  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+    return "\n".join(lines)
+
+
+def _run_az_diagnostic(cmd: tuple[str, ...]) -> tuple[Optional[str], Optional[AzureCliError]]:
+    """Run a diagnostic query and return its output or the Azure CLI error."""
 
     try:
-        inbound_proc = _run_az(
-            (
-                "network",
-                "lb",
-                "rule",
-                "list",
-                "--resource-group",
-                node_resource_group,
-                "--lb-name",
-                "kubernetes",
-                "-o",
-                "table",
-            )
-        )
-        print("🚦 Inbound rules (kubernetes LB):")
-        print(inbound_proc.stdout.strip() or "(none)")
+        return _run_az(cmd).stdout, None
     except AzureCliError as exc:
-        print(f"⚠️  Unable to inspect kubernetes load balancer rules: {exc}")
+        return None, exc
+
+
+def _print_table(heading: str, rows: list[list[str]], headers: Iterable[str]) -> None:
+    print(heading)
+    print(_format_table(rows, headers) if rows else "(none)")
+
 
+def _cells(row: Iterable[object]) -> list[str]:
+    return ["" if cell is None else str(cell) for cell in row]
+
+
+def _emit_azure_diagnostics(node_resource_group: str) -> None:
+    """Surface Azure load balancer diagnostics to aid troubleshooting."""
+
+    commands = _azure_diagnostic_commands(node_resource_group)
+    # The listings are independent, so run them concurrently and print the
+    # results in a stable order afterwards.
+    with ThreadPoolExecutor(max_workers=len(commands)) as executor:
+        (ip_stdout, ip_error), (lb_stdout, lb_error) = executor.map(_run_az_diagnostic, commands)
+
+    print("::group::Azure load balancer diagnostics", flush=True)
+    if ip_error is not None:
+        print(f"⚠️  Unable to list public IPs: {ip_error}")
+    else:
+        rows = [row for row in csv.reader(io.StringIO(ip_stdout), delimiter="\t") if row]
+        _print_table("📡 Public IP addresses:", rows, ("Name", "IpAddress", "ProvisioningState"))
+
+    if lb_error is not None:
+        print(f"⚠️  Unable to list load balancers: {lb_error}")
+    else:
+        load_balancers = _json_loads(lb_stdout or "[]")
+        _print_table(
+            "📦 Load balancers:",
+            [_cells((lb.get("name"), lb.get("provisioningState"))) for lb in load_balancers],
+            ("Name", "ProvisioningState"),
+        )
+        kubernetes_lb = next((lb for lb in load_balancers if lb.get("name") == "kubernetes"), {})
+        _print_table(
+            "🔀 Frontend IP configurations (kubernetes LB):",
+            [_cells(row) for row in kubernetes_lb.get("frontends") or []],
+            ("Name", "PrivateIpAddress", "PublicIpAddress", "ProvisioningState"),
+        )
+        _print_table(
+            "🚦 Inbound rules (kubernetes LB):",
+            [_cells(row) for row in kubernetes_lb.get("rules") or []],
+            ("Name", "Protocol", "FrontendPort", "BackendPort", "ProvisioningState"),
+        )
     print("::endgroup::", flush=True)
 
 
@@ -245,6 +382,7 @@ def _discover_node_resource_group(resource_group: str, aks_name: str) -> Optiona
 
     if not resource_group or not aks_name:
         return None
+
     try:
         proc = _run_az(
             (
@@ -269,7 +407,7 @@ def _discover_node_resource_group(resource_group: str, aks_name: str) -> Optiona
     return node_rg or None
 
 
-@dataclass
+@dataclass(slots=True)
 class EnsureOptions:
     service: str
     resource_group: Optional[str]
@@ -278,44 +416,99 @@ class EnsureOptions:
     interval: int
 
 
-def parse_args(argv: Optional[Iterable[str]] = None) -> EnsureOptions:
+# Flags understood by the argv fast path, mapped to their EnsureOptions fields.
+OPTION_FIELDS = {
+    "--ingress-service": "service",
+    "--resource-group": "resource_group",
+    "--aks-name": "aks_name",
+    "--timeout": "timeout",
+    "--interval": "interval",
+}
+INT_OPTION_FIELDS = frozenset({"timeout", "interval"})
+
+
+def _option_defaults() -> dict:
+    """Return the EnsureOptions defaults shared by the fast path and argparse."""
+
+    return {
+        "service": DEFAULT_SERVICE,
+        "resource_group": os.environ.get("RESOURCE_GROUP"),
+        "aks_name": os.environ.get("AKS_NAME"),
+        "timeout": 900,
+        "interval": 15,
+    }
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    import argparse
+
+    defaults = _option_defaults()
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument(
         "--ingress-service",
-        default=DEFAULT_SERVICE,
+        dest="service",
+        metavar="INGRESS_SERVICE",
+        default=defaults["service"],
         help="Ingress service reference (<namespace>/<name> or <namespace>/<resource>/<name>)",
     )
     parser.add_argument(
         "--resource-group",
-        default=os.environ.get("RESOURCE_GROUP"),
+        default=defaults["resource_group"],
         help="Azure resource group that contains the AKS control plane",
     )
     parser.add_argument(
         "--aks-name",
-        default=os.environ.get("AKS_NAME"),
+        default=defaults["aks_name"],
         help="AKS cluster name",
     )
     parser.add_argument(
         "--timeout",
         type=int,
-        default=900,
+        default=defaults["timeout"],
         help="Seconds to wait for the load balancer to expose an address",
     )
     parser.add_argument(
         "--interval",
         type=int,
-        default=15,
+        default=defaults["interval"],
         help="Polling interval in seconds while waiting for the load balancer",
     )
+    return parser
+
+
+def _parse_known_flags(args: list[str]) -> Optional[dict]:
+    """Parse *args* without argparse; return ``None`` if anything needs argparse."""
+
+    values: dict = {}
+    index = 0
+    while index < len(args):
+        flag, has_value, value = args[index].partition("=")
+        field = OPTION_FIELDS.get(flag)
+        if field is None:
+            return None
+        if not has_value:
+            index += 1
+            if index == len(args) or args[index].startswith("-"):
+                return None
+            value = args[index]
+        if field in INT_OPTION_FIELDS:
+            try:
+                value = int(value)
+            except ValueError:
+                return None
+        values[field] = value
+        index += 1
+    return {**_option_defaults(), **values}
 
-    args = parser.parse_args(argv)
-    return EnsureOptions(
-        service=args.ingress_service,
-        resource_group=args.resource_group,
-        aks_name=args.aks_name,
-        timeout=args.timeout,
-        interval=args.interval,
-    )
+
+def parse_args(argv: Optional[Iterable[str]] = None) -> EnsureOptions:
+    args = list(sys.argv[1:] if argv is None else argv)
+    values = _parse_known_flags(args)
+    if values is None:
+        # Help output, abbreviations and error reporting are left to argparse,
+        # which is only imported and built when the fast path gives up.
+        values = vars(_build_parser().parse_args(args))
+    return EnsureOptions(**values)
 
 
 def main(argv: Optional[Iterable[str]] = None) -> int:
@@ -325,20 +518,17 @@ def main(argv: Optional[Iterable[str]] = None) -> int:
 
     print(f"ℹ️  Ensuring ingress service {namespace}/{name} is backed by an Azure load balancer.")
     service = _kubectl_json(namespace, name)
-    patched = False
-
-    if _ensure_service_type(service, namespace, name):
-        patched = True
-        service = _kubectl_json(namespace, name)
+    patch: dict = {}
+    _ensure_service_type(service, namespace, name, patch)
 
     if node_rg:
         annotation_key = "service.beta.kubernetes.io/azure-load-balancer-resource-group"
-        if _ensure_annotation(service, namespace, name, annotation_key, node_rg):
-            patched = True
+        _ensure_annotation(service, namespace, name, annotation_key, node_rg, patch)
 
-    if patched:
-        # Re-fetch to ensure we have up-to-date status for waiting.
-        service = _kubectl_json(namespace, name)
+    if patch:
+        # Apply the type and annotation changes together; the wait loop below
+        # observes the resulting status without another GET.
+        _patch_service(namespace, name, patch)
 
     try:
         _wait_for_load_balancer(options.service, options.timeout, options.interval)
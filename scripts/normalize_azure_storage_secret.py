@@ -2,14 +2,47 @@
 """Normalize Azure Storage credentials into the cnpg-azure-backup secret."""
 from __future__ import annotations
 
-import argparse
+import base64
 import hashlib
 import json
 import re
+import string
 import subprocess
+import sys
 from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable
 from urllib.parse import urlparse
 
+if TYPE_CHECKING:
+    import argparse
+
+try:  # orjson is optional; it only speeds up decoding JSON-wrapped credentials.
+    import orjson
+except ImportError:  # pragma: no cover - depends on the local environment
+    orjson = None
+
+WHITESPACE_RE = re.compile(r"\s+")
+URL_SCHEME_RE = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*://")
+SEGMENT_SPLIT_RE = re.compile(r"[;\n]+")
+BLOB_HOST_RE = re.compile(r"^(?P<name>[^.]+)\.blob\.core\.windows\.net$")
+STDLIB_JSON_DECODE = json.JSONDecoder().decode
+JSON_DECODE = orjson.loads if orjson is not None else STDLIB_JSON_DECODE
+BASE64_ALPHABET = frozenset(string.ascii_letters + string.digits + "+/=_-")
+# Lowercase connection string keys; the substring check runs first to skip the regex.
+CONNECTION_KEY_TOKENS = (
+    "accountname=",
+    "accountkey=",
+    "sharedaccesssignature=",
+    "defaultendpointsprotocol=",
+    "blobendpoint=",
+    "queueendpoint=",
+    "tableendpoint=",
+    "fileendpoint=",
+    "endpointsuffix=",
+)
+# Matched against the lowercased credential, so no IGNORECASE is needed.
+CONNECTION_KEY_RE = re.compile(r"\b(?:" + "|".join(map(re.escape, CONNECTION_KEY_TOKENS)) + ")")
+
 
 @dataclass
 class AzureCredential:
@@ -20,7 +53,7 @@ class AzureCredential:
 
 
 def _redacted_preview(value: str) -> str:
-    compact = re.sub(r"\s+", " ", value.strip())
+    compact = WHITESPACE_RE.sub(" ", value.strip())
     if not compact:
         return "<empty>"
     if len(compact) <= 6:
@@ -37,97 +70,115 @@ def _heuristic_summary(value: str) -> str:
         "has_newlines": "\n" in value,
         "has_question": "?" in value,
         "looks_json": value.lstrip().startswith(("{", "[")),
-        "looks_url": bool(re.match(r"^[a-zA-Z][a-zA-Z0-9+.-]*://", value)),
+        "looks_url": bool(URL_SCHEME_RE.match(value)),
         "has_accountname": "accountname" in normalized_lower,
         "has_sig": "sig=" in normalized_lower,
     }
     return ", ".join(f"{key}={'yes' if val else 'no'}" for key, val in heuristics.items())
 
 
-def parse_credential(raw: str, storage_account: str) -> AzureCredential:
+@dataclass(frozen=True)
+class CredentialTraits:
+    has_equals: bool
+    has_semicolon: bool
+    has_newline: bool
+    has_question: bool
+    has_sas_fields: bool
+    is_development_storage: bool
+    looks_json: bool
+    has_connection_key: bool
+
+    @classmethod
+    def classify(cls, normalized_value: str) -> "CredentialTraits":
+        normalized_lower = normalized_value.lower()
+        has_equals = "=" in normalized_value
+        has_semicolon = ";" in normalized_value
+        has_newline = "\n" in normalized_value
+        # Separated values are parsed as connection strings anyway, so the key
+        # regex only runs for single-segment values that mention a known key.
+        has_connection_key = (
+            has_equals
+            and not (has_semicolon or has_newline)
+            and any(token in normalized_lower for token in CONNECTION_KEY_TOKENS)
+            and CONNECTION_KEY_RE.search(normalized_lower) is not None
+        )
+        return cls(
+            has_equals=has_equals,
+            has_semicolon=has_semicolon,
+            has_newline=has_newline,
+            has_question="?" in normalized_value,
+            has_sas_fields="sig=" in normalized_lower and "sv=" in normalized_lower,
+            is_development_storage=normalized_lower.startswith("usedevelopmentstorage=true"),
+            looks_json=normalized_value.lstrip().startswith(("{", "[")),
+            has_connection_key=has_connection_key,
+        )
+
+
+def _unquote(raw: str) -> str:
     value = raw.strip()
     if (value.startswith("\"") and value.endswith("\"")) or (
         value.startswith("'") and value.endswith("'")
     ):
         value = value[1:-1].strip()
-    if not value:
-        raise ValueError("Credential must not be empty")
+    return value
 
-    normalized_value = value.replace("\r\n", "\n").replace("\r", "\n")
 
-    if normalized_value.lower().startswith("usedevelopmentstorage=true"):
-        parts = [segment.strip() for segment in re.split(r"[;\n]+", normalized_value) if segment.strip()]
-        connection_string = ";".join(parts)
-        return AzureCredential(
-            storage_account=storage_account,
-            connection_string=connection_string,
-        )
-    if "=" in normalized_value and (
-        ";" in normalized_value
-        or "\n" in normalized_value
-        or re.search(
-            r"\b(accountname|accountkey|sharedaccesssignature|defaultendpointsprotocol|"
-            r"blobendpoint|queueendpoint|tableendpoint|fileendpoint|endpointsuffix)=",
-            normalized_value,
-            flags=re.IGNORECASE,
-        )
-    ):
-        parts: dict[str, tuple[str, str]] = {}
-        for segment in re.split(r"[;\n]+", normalized_value):
-            if not segment:
-                continue
-            match = re.match(r"\s*([^:=]+)\s*[:=]\s*(.*)\s*$", segment)
-            if not match:
-                continue
-            key = match.group(1).strip()
-            val = match.group(2).strip()
-            if not key:
-                continue
-            parts[key.lower()] = (key, val)
-
-        account = parts.get("accountname", ("AccountName", storage_account))[1]
-        account_key = parts.get("accountkey", ("AccountKey", None))[1]
-        sas = parts.get("sharedaccesssignature", ("SharedAccessSignature", None))[1]
-
-        connection: list[str] = []
-        if "defaultendpointsprotocol" in parts:
-            original_key, proto = parts["defaultendpointsprotocol"]
-            connection.append(f"{original_key}={proto}")
-        else:
-            connection.append("DefaultEndpointsProtocol=https")
-
-        if account:
-            connection.append(f"AccountName={account}")
-
-        blob_endpoint = parts.get("blobendpoint")
-        if blob_endpoint:
-            connection.append(f"{blob_endpoint[0]}={blob_endpoint[1]}")
-
-        if account_key:
-            connection.append(f"AccountKey={account_key}")
-
-        if sas:
-            connection.append(f"SharedAccessSignature={sas}")
-
-        if "endpointsuffix" in parts:
-            suffix_key, suffix_val = parts["endpointsuffix"]
-            connection.append(f"{suffix_key}={suffix_val}")
-        elif not blob_endpoint:
-            connection.append("EndpointSuffix=core.windows.net")
-
-        for endpoint_key in ("queueendpoint", "tableendpoint", "fileendpoint"):
-            if endpoint_key in parts:
-                original_key, val = parts[endpoint_key]
-                connection.append(f"{original_key}={val}")
-
-        connection_string = ";".join(connection)
-        return AzureCredential(
-            storage_account=account or storage_account,
-            connection_string=connection_string,
-            account_key=account_key,
-            sas_token=sas,
-        )
+def _parse_development_storage(value: str, normalized_value: str, storage_account: str) -> AzureCredential:
+    parts = [segment.strip() for segment in SEGMENT_SPLIT_RE.split(normalized_value) if segment.strip()]
+    connection_string = ";".join(parts)
+    return AzureCredential(
+        storage_account=storage_account,
+        connection_string=connection_string,
+    )
+
 
+def _part_value(parts: dict[str, tuple[str, str]], key: str, default: str | None = None) -> str | None:
+    entry = parts.get(key)
+    return entry[1] if entry else default
+
+
+def _parse_connection_string(
+    value: str, normalized_value: str, storage_account: str
+) -> AzureCredential | None:
+    parts: dict[str, tuple[str, str]] = {}
+    for segment in SEGMENT_SPLIT_RE.split(normalized_value):
+        # Split on whichever of "=" or ":" comes first.
+        key, sep, val = segment.partition("=")
+        if ":" in key:
+            key, sep, val = segment.partition(":")
+        if not sep:
+            continue
+        key = key.strip()
+        if not key:
+            continue
+        parts[key.lower()] = (key, val.strip())
+
+    account = _part_value(parts, "accountname", storage_account)
+    account_key = _part_value(parts, "accountkey")
+    sas = _part_value(parts, "sharedaccesssignature")
+
+    protocol = parts.get("defaultendpointsprotocol")
+    blob_endpoint = parts.get("blobendpoint")
+    suffix = parts.get("endpointsuffix")
+    fields = (
+        "=".join(protocol) if protocol else "DefaultEndpointsProtocol=https",
+        f"AccountName={account}" if account else None,
+        "=".join(blob_endpoint) if blob_endpoint else None,
+        f"AccountKey={account_key}" if account_key else None,
+        f"SharedAccessSignature={sas}" if sas else None,
+        "=".join(suffix) if suffix else (None if blob_endpoint else "EndpointSuffix=core.windows.net"),
+        *("=".join(parts[key]) for key in ("queueendpoint", "tableendpoint", "fileendpoint") if key in parts),
+    )
+    connection_string = ";".join(field for field in fields if field)
+    return AzureCredential(
+        storage_account=account or storage_account,
+        connection_string=connection_string,
+        account_key=account_key,
+        sas_token=sas,
+    )
+
+
+def _parse_sas_url(value: str, normalized_value: str, storage_account: str) -> AzureCredential | None:
     parsed_url = urlparse(value)
     url_query = parsed_url.query
     if not url_query and parsed_url.path and "?" in parsed_url.path:
@@ -135,109 +186,177 @@ def parse_credential(raw: str, storage_account: str) -> AzureCredential:
         parsed_url = parsed_url._replace(path=path)
         url_query = query
 
-    if parsed_url.scheme and url_query:
-        query_items = url_query.lower()
-        if "sig=" in query_items and "sv=" in query_items:
-            token = url_query
-            account = storage_account
-            if parsed_url.hostname:
-                match = re.match(r"^(?P<name>[^.]+)\.blob\.core\.windows\.net$", parsed_url.hostname)
-                if match:
-                    account = match.group("name")
-            if parsed_url.hostname:
-                blob_endpoint = f"{parsed_url.scheme}://{parsed_url.hostname}/"
-            else:
-                blob_endpoint = f"https://{account}.blob.core.windows.net/"
-            connection_string = (
-                "DefaultEndpointsProtocol=https;"
-                f"AccountName={account};"
-                f"BlobEndpoint={blob_endpoint};"
-                f"SharedAccessSignature={token}"
-            )
-            return AzureCredential(
-                storage_account=account,
-                connection_string=connection_string,
-                sas_token=token,
-            )
+    if not (parsed_url.scheme and url_query):
+        return None
+    query_items = url_query.lower()
+    if "sig=" not in query_items or "sv=" not in query_items:
+        return None
+
+    token = url_query
+    account = storage_account
+    if parsed_url.hostname:
+        match = BLOB_HOST_RE.match(parsed_url.hostname)
+        if match:
+            account = match.group("name")
+    if parsed_url.hostname:
+        blob_endpoint = f"{parsed_url.scheme}://{parsed_url.hostname}/"
+    else:
+        blob_endpoint = f"https://{account}.blob.core.windows.net/"
+    connection_string = (
+        "DefaultEndpointsProtocol=https;"
+        f"AccountName={account};"
+        f"BlobEndpoint={blob_endpoint};"
+        f"SharedAccessSignature={token}"
+    )
+    return AzureCredential(
+        storage_account=account,
+        connection_string=connection_string,
+        sas_token=token,
+    )
+
 
+def _parse_sas_token(value: str, normalized_value: str, storage_account: str) -> AzureCredential | None:
     token = value.lstrip("?")
-    token_lower = token.lower()
-    if "sig=" in token_lower and "sv=" in token_lower:
-        connection_string = (
-            "DefaultEndpointsProtocol=https;"
-            f"AccountName={storage_account};"
-            f"BlobEndpoint=https://{storage_account}.blob.core.windows.net/;"
-            f"SharedAccessSignature={token}"
-        )
-        return AzureCredential(storage_account=storage_account, connection_string=connection_string, sas_token=token)
+    connection_string = (
+        "DefaultEndpointsProtocol=https;"
+        f"AccountName={storage_account};"
+        f"BlobEndpoint=https://{storage_account}.blob.core.windows.net/;"
+        f"SharedAccessSignature={token}"
+    )
+    return AzureCredential(storage_account=storage_account, connection_string=connection_string, sas_token=token)
+
 
+def _parse_account_key(value: str, normalized_value: str, storage_account: str) -> AzureCredential | None:
     base64_like = normalized_value.strip()
-    if (
-        base64_like
-        and not re.search(r"[;&?{}\s]", base64_like)
+    if not (
+        len(base64_like) >= 15
         and "=" not in base64_like.rstrip("=")
-        and re.fullmatch(r"[A-Za-z0-9+/=_-]{15,}", base64_like)
+        and BASE64_ALPHABET.issuperset(base64_like)
     ):
-        connection_string = (
-            "DefaultEndpointsProtocol=https;"
-            f"AccountName={storage_account};"
-            f"AccountKey={value};"
-            "EndpointSuffix=core.windows.net"
-        )
-        return AzureCredential(
-            storage_account=storage_account,
-            connection_string=connection_string,
-            account_key=value,
-        )
+        return None
+    connection_string = (
+        "DefaultEndpointsProtocol=https;"
+        f"AccountName={storage_account};"
+        f"AccountKey={value};"
+        "EndpointSuffix=core.windows.net"
+    )
+    return AzureCredential(
+        storage_account=storage_account,
+        connection_string=connection_string,
+        account_key=value,
+    )
 
-    stripped = normalized_value.lstrip()
-    if "\n" in normalized_value and not stripped.startswith(("{", "[")):
-        colon_segments: list[str] = []
-        for line in normalized_value.splitlines():
-            clean_line = line.strip()
-            if not clean_line or ":" not in clean_line:
-                continue
-            key, val = clean_line.split(":", 1)
-            cleaned_val = val.strip()
-            cleaned_val = cleaned_val.split("#", 1)[0].strip().strip("\"").strip("'")
-            colon_segments.append(f"{key.strip()}={cleaned_val}")
-        if colon_segments:
-            try:
-                return parse_credential(";".join(colon_segments), storage_account)
-            except ValueError:
-                pass
 
+def _parse_colon_pairs(value: str, normalized_value: str, storage_account: str) -> AzureCredential | None:
+    colon_segments: list[str] = []
+    for line in normalized_value.splitlines():
+        clean_line = line.strip()
+        if not clean_line or ":" not in clean_line:
+            continue
+        key, _, val = clean_line.partition(":")
+        cleaned_val = val.partition("#")[0].strip().strip("\"").strip("'")
+        colon_segments.append(f"{key.strip()}={cleaned_val}")
+    if not colon_segments:
+        return None
+    return _detect_credential(";".join(colon_segments), storage_account, allow_json=False)
+
+
+# Parsers in priority order, each gated by a predicate over the precomputed traits.
+# Every parser takes (value, normalized_value, storage_account), even if it only
+# needs one of the two forms, so the dispatch loop can call them uniformly.
+CREDENTIAL_PARSERS: tuple[
+    tuple[
+        Callable[[CredentialTraits], bool],
+        Callable[[str, str, str], AzureCredential | None],
+    ],
+    ...,
+] = (
+    (lambda traits: traits.is_development_storage, _parse_development_storage),
+    (
+        lambda traits: traits.has_equals
+        and (traits.has_semicolon or traits.has_newline or traits.has_connection_key),
+        _parse_connection_string,
+    ),
+    (lambda traits: traits.has_question and traits.has_sas_fields, _parse_sas_url),
+    (lambda traits: traits.has_sas_fields, _parse_sas_token),
+    (lambda traits: not (traits.has_semicolon or traits.has_newline or traits.has_question), _parse_account_key),
+    (lambda traits: traits.has_newline and not traits.looks_json, _parse_colon_pairs),
+)
+
+
+def _iter_string_candidates(obj: object) -> list[str]:
+    stack: list[object] = [obj]
+    strings: list[str] = []
+    while stack:
+        current = stack.pop()
+        # Decoded JSON only holds exact builtin types, so identity checks suffice.
+        kind = type(current)
+        if kind is str:
+            normalized = current.strip()
+            if normalized:
+                strings.append(normalized)
+        elif kind is dict:
+            stack.extend(current.values())
+        elif kind is list:
+            stack.extend(current)
+    return strings
+
+
+def _parse_json_wrapper(value: str, storage_account: str) -> AzureCredential | None:
+    # Only objects, arrays and strings can wrap a credential; skip the decoder
+    # (and its exception) for keys, tokens and other plain values.
+    if not value.lstrip().startswith(("{", "[", "\"")):
+        return None
     try:
-        decoded = json.loads(value)
-    except json.JSONDecodeError:
-        decoded = None
-    if decoded is not None:
-        def iter_string_candidates(obj: object) -> list[str]:
-            stack: list[object] = [obj]
-            strings: list[str] = []
-            while stack:
-                current = stack.pop()
-                if isinstance(current, str):
-                    normalized = current.strip()
-                    if normalized:
-                        strings.append(normalized)
-                elif isinstance(current, dict):
-                    for child in current.values():
-                        stack.append(child)
-                elif isinstance(current, list):
-                    stack.extend(current)
-            return strings
-
-        seen: set[str] = set()
-        for candidate in iter_string_candidates(decoded):
-            if candidate == value or candidate in seen:
-                continue
-            seen.add(candidate)
-            try:
-                return parse_credential(candidate, storage_account)
-            except ValueError:
-                continue
+        decoded = JSON_DECODE(value)
+    except ValueError:
+        # orjson rejects NaN/Infinity and lone surrogate escapes that json accepts;
+        # retry so the accepted inputs do not depend on which decoder is installed.
+        if JSON_DECODE is STDLIB_JSON_DECODE:
+            return None
+        try:
+            decoded = STDLIB_JSON_DECODE(value)
+        except ValueError:
+            return None
+    if decoded is None:
+        return None
+    # Wrapped strings are only examined one level deep and each distinct string once.
+    for candidate in dict.fromkeys(_iter_string_candidates(decoded)):
+        if candidate == value:
+            continue
+        candidate = _unquote(candidate)
+        if not candidate:
+            continue
+        credential = _detect_credential(candidate, storage_account, allow_json=False)
+        if credential is not None:
+            return credential
+    return None
+
+
+def _detect_credential(value: str, storage_account: str, *, allow_json: bool = True) -> AzureCredential | None:
+    normalized_value = value.replace("\r\n", "\n").replace("\r", "\n")
+    traits = CredentialTraits.classify(normalized_value)
+    for applies, parser in CREDENTIAL_PARSERS:
+        if not applies(traits):
+            continue
+        credential = parser(value, normalized_value, storage_account)
+        if credential is not None:
+            return credential
+    if allow_json:
+        return _parse_json_wrapper(value, storage_account)
+    return None
 
+
+def parse_credential(raw: str, storage_account: str) -> AzureCredential:
+    value = _unquote(raw)
+    if not value:
+        raise ValueError("Credential must not be empty")
+
+    credential = _detect_credential(value, storage_account)
+    if credential is not None:
+        return credential
+
+    normalized_value = value.replace("\r\n", "\n").replace("\r", "\n")
     fingerprint = hashlib.sha256(normalized_value.encode("utf-8")).hexdigest()[:12]
     debug_hint = _heuristic_summary(normalized_value)
     preview = _redacted_preview(normalized_value)
@@ -247,43 +366,106 @@ def parse_credential(raw: str, storage_account: str) -> AzureCredential:
     )
 
 
-def apply_secret(namespace: str, credential: AzureCredential) -> None:
-    args = [
-        "kubectl",
-        "-n",
-        namespace,
-        "create",
-        "secret",
-        "generic",
-        "cnpg-azure-backup",
-        "--dry-run=client",
-        "-o",
-        "yaml",
-        f"--from-literal=AZURE_STORAGE_ACCOUNT={credential.storage_account}",
-        f"--from-literal=AZURE_CONNECTION_STRING={credential.connection_string}",
-    ]
+def render_secret(namespace: str, credential: AzureCredential) -> str:
+    """Return the cnpg-azure-backup Secret manifest as JSON (valid input for kubectl apply)."""
+    data = {
+        "AZURE_STORAGE_ACCOUNT": credential.storage_account,
+        "AZURE_CONNECTION_STRING": credential.connection_string,
+    }
     if credential.account_key:
-        args.append(f"--from-literal=AZURE_STORAGE_KEY={credential.account_key}")
+        data["AZURE_STORAGE_KEY"] = credential.account_key
     if credential.sas_token:
-        args.append(f"--from-literal=AZURE_STORAGE_SAS_TOKEN={credential.sas_token}")
-    proc = subprocess.run(args, check=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    if proc.returncode != 0:
-        raise RuntimeError(proc.stderr.strip() or "Failed to render cnpg-azure-backup secret")
-    apply = subprocess.run(["kubectl", "apply", "-f", "-"], input=proc.stdout, text=True, check=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        data["AZURE_STORAGE_SAS_TOKEN"] = credential.sas_token
+    manifest = {
+        "apiVersion": "v1",
+        "kind": "Secret",
+        "metadata": {"name": "cnpg-azure-backup", "namespace": namespace},
+        "type": "Opaque",
+        "data": {key: base64.b64encode(val.encode("utf-8")).decode("ascii") for key, val in data.items()},
+    }
+    return json.dumps(manifest)
+
+
+def apply_secret(namespace: str, credential: AzureCredential) -> None:
+    apply = subprocess.run(
+        [
+            "kubectl",
+            "apply",
+            "--server-side",
+            "--force-conflicts",
+            "--field-manager=normalize-azure-storage-secret",
+            "-f",
+            "-",
+        ],
+        input=render_secret(namespace, credential).encode(),
+        check=False,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
     if apply.returncode != 0:
-        raise RuntimeError(apply.stderr.strip() or "kubectl apply failed")
+        raise RuntimeError(apply.stderr.decode(errors="replace").strip() or "kubectl apply failed")
+
 
+@dataclass(slots=True)
+class SecretOptions:
+    namespace: str
+    storage_account: str
+    credential: str
+
+
+# Flags understood by the argv fast path, mapped to their SecretOptions fields.
+OPTION_FIELDS = {
+    "--namespace": "namespace",
+    "--storage-account": "storage_account",
+    "--credential": "credential",
+}
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    import argparse
 
-def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("--namespace", required=True)
     parser.add_argument("--storage-account", required=True)
     parser.add_argument("--credential", required=True)
-    return parser.parse_args()
-
-
-def main() -> int:
-    args = parse_args()
+    return parser
+
+
+def _parse_known_flags(args: list[str]) -> dict[str, str] | None:
+    """Parse *args* without argparse; return ``None`` if anything needs argparse."""
+
+    values: dict[str, str] = {}
+    index = 0
+    while index < len(args):
+        flag, has_value, value = args[index].partition("=")
+        field = OPTION_FIELDS.get(flag)
+        if field is None:
+            return None
+        if not has_value:
+            index += 1
+            if index == len(args) or args[index].startswith("-"):
+                return None
+            value = args[index]
+        values[field] = value
+        index += 1
+    if len(values) != len(OPTION_FIELDS):
+        return None
+    return values
+
+
+def parse_args(argv: list[str] | None = None) -> SecretOptions:
+    args = sys.argv[1:] if argv is None else list(argv)
+    values = _parse_known_flags(args)
+    if values is None:
+        # Help output and error reporting are left to argparse, which is only
+        # imported and built when the fast path gives up.
+        parsed = _build_parser().parse_args(args)
+        values = {field: getattr(parsed, field) for field in OPTION_FIELDS.values()}
+    return SecretOptions(**values)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
     credential = parse_credential(args.credential, args.storage_account)
     apply_secret(args.namespace, credential)
     return 0
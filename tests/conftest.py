@@ -1,8 +1,53 @@
 from __future__ import annotations
 
+import functools
+import re
 import sys
+import types
 from pathlib import Path
 
+import pytest
+
+# ``KEY=value`` lines; comments and blank lines never match.
+ENV_LINE_RE = re.compile(r"^[ \t]*([A-Za-z_][A-Za-z0-9_]*)[ \t]*=(.*?)[ \t]*$", re.MULTILINE)
+
 REPO_ROOT = Path(__file__).resolve().parents[1]
 if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
+
+
+@functools.lru_cache(maxsize=None)
+def _yaml_loader():
+    # PyYAML is imported on first use so runs that skip the manifest tests never load it.
+    import yaml
+
+    # libyaml parses an order of magnitude faster than the pure-Python loader.
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    return functools.partial(yaml.load, Loader=loader)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_yaml_cached(path: str):
+    # PyYAML decodes UTF-8 bytes itself, so skip the str round trip.
+    data = (REPO_ROOT / path).read_bytes()
+    data = data.replace(b"values: |\n{{ toYaml .values | indent 12 }}\n", b"values: {}\n")
+    if b"\ntemplate:" in data:
+        data = data.split(b"\ntemplate:", 1)[0] + b"\n"
+    return _yaml_loader()(data)
+
+
+@pytest.fixture(scope="session")
+def load_yaml():
+    """Return a loader for repo-relative manifests, parsed once per session; treat results as read-only."""
+    return _load_yaml_cached
+
+
+@functools.lru_cache(maxsize=None)
+def _load_env_cached(path: str):
+    return types.MappingProxyType(dict(ENV_LINE_RE.findall((REPO_ROOT / path).read_text(encoding="utf-8"))))
+
+
+@pytest.fixture(scope="session")
+def load_env():
+    """Return a loader for repo-relative ``KEY=value`` env files, parsed once per session."""
+    return _load_env_cached
@@ -1,4 +1,5 @@
 import argparse
+import os
 from pathlib import Path
 
 import pytest
@@ -18,28 +19,36 @@ def test_write_and_read_params(tmp_path: Path):
     hosts = cd.build_hosts("192.168.0.42")
     cd.write_params(params, "custom", hosts)
 
-    text = params.read_text(encoding="utf-8")
-    assert "ingressClass=custom" in text
-    assert "keycloakHost=kc.192.168.0.42.nip.io" in text
-    assert "argocdHost=argocd.192.168.0.42.nip.io" in text
+    data = params.read_bytes()
+    assert b"ingressClass=custom\n" in data
+    assert b"keycloakHost=kc.192.168.0.42.nip.io\n" in data
+    assert b"argocdHost=argocd.192.168.0.42.nip.io\n" in data
     assert cd.read_ingress_class(params) == "custom"
 
 
+def test_write_params_skips_unchanged_file(tmp_path: Path):
+    params = tmp_path / "params.env"
+    hosts = cd.build_hosts("192.168.0.42")
+    cd.write_params(params, "nginx", hosts)
+    os.utime(params, ns=(0, 0))
+
+    cd.write_params(params, "nginx", hosts)
+    assert params.stat().st_mtime_ns == 0
+
+    cd.write_params(params, "custom", hosts)
+    assert params.stat().st_mtime_ns != 0
+
+
 def test_main_updates_env_files(monkeypatch, tmp_path: Path, capsys):
     params = tmp_path / "params.env"
-    params.write_text("ingressClass=test\n", encoding="utf-8")
+    params.write_bytes(b"ingressClass=test\n")
 
     bootstrap_params = tmp_path / "bootstrap_params.env"
     manifest = tmp_path / "ingress.yaml"
-    manifest.write_text(
-        "\n".join(
-            [
-                "hostname: kc.198.51.100.7.nip.io",
-                "- host: mp.198.51.100.7.nip.io",
-                "  some: argocd.198.51.100.7.nip.io",
-            ]
-        ),
-        encoding="utf-8",
+    manifest.write_bytes(
+        b"hostname: kc.198.51.100.7.nip.io\n"
+        b"- host: mp.198.51.100.7.nip.io\n"
+        b"  some: argocd.198.51.100.7.nip.io"
     )
     env_file = tmp_path / "github_env"
     out_file = tmp_path / "github_output"
@@ -61,9 +70,11 @@ def test_main_updates_env_files(monkeypatch, tmp_path: Path, capsys):
         print_only=False,
         skip_reachability_check=False,
     )
-    monkeypatch.setattr(cd, "parse_args", lambda: args)
+    # The namespace is injected directly: passing these flags through argv would
+    # append to the repository defaults and rewrite the real GitOps files.
+    monkeypatch.setattr(cd, "parse_args", lambda argv=None: args)
 
-    assert cd.main() == 0
+    assert cd.main([]) == 0
 
     captured = capsys.readouterr()
     assert "KC_HOST=kc.203.0.113.10.nip.io" in captured.out
@@ -89,13 +100,21 @@ def test_main_updates_env_files(monkeypatch, tmp_path: Path, capsys):
     assert "argocd_url=http://argocd.203.0.113.10.nip.io" in output_contents
 
 
+def test_main_print_only_accepts_argv(monkeypatch, capsys):
+    monkeypatch.setattr(cd, "ensure_ingress_accessible", lambda *args, **kwargs: None)
+
+    assert cd.main(["--ingress-ip", "203.0.113.10", "--print-only"]) == 0
+
+    assert "kc.203.0.113.10.nip.io" in capsys.readouterr().out
+
+
 def test_discover_stale_hosts(tmp_path: Path):
     tracked = tmp_path / "manifests"
     tracked.mkdir()
     file_one = tracked / "kc.yaml"
-    file_one.write_text("hostname: kc.192.0.2.4.nip.io", encoding="utf-8")
+    file_one.write_bytes(b"hostname: kc.192.0.2.4.nip.io")
     file_two = tracked / "other.txt"
-    file_two.write_text("argocd.203.0.113.8.nip.io", encoding="utf-8")
+    file_two.write_bytes(b"argocd.203.0.113.8.nip.io")
 
     stale = cd.discover_stale_hosts([tracked], "203.0.113.8")
     assert stale == [(file_one.resolve(), "kc.192.0.2.4.nip.io")]
@@ -104,33 +123,131 @@ def test_discover_stale_hosts(tmp_path: Path):
     assert "kc.192.0.2.4.nip.io" in str(excinfo.value)
 
     # When the inputs only contain the expected IP, the result is empty.
-    file_one.write_text("hostname: kc.203.0.113.8.nip.io", encoding="utf-8")
+    file_one.write_bytes(b"hostname: kc.203.0.113.8.nip.io")
     stale = cd.discover_stale_hosts([tracked], "203.0.113.8")
     assert stale == []
     cd.ensure_hosts_rotated([tracked], "203.0.113.8")
 
 
+def test_discover_stale_hosts_skips_hidden_dirs_and_binary_files(tmp_path: Path):
+    hidden = tmp_path / ".git"
+    hidden.mkdir()
+    (hidden / "config.yaml").write_bytes(b"kc.192.0.2.4.nip.io")
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG mp.192.0.2.4.nip.io")
+    tracked = tmp_path / "params.env"
+    tracked.write_bytes(b"keycloakHost=kc.192.0.2.4.nip.io")
+
+    stale = cd.discover_stale_hosts([tmp_path], "203.0.113.8")
+    assert stale == [(tracked.resolve(), "kc.192.0.2.4.nip.io")]
+
+
+def test_discover_stale_hosts_skips_broken_symlinks(tmp_path: Path):
+    (tmp_path / "dangling.yaml").symlink_to(tmp_path / "missing.yaml")
+    tracked = tmp_path / "params.env"
+    tracked.write_text("KEYCLOAK_HOST=kc.192.0.2.4.nip.io\n")
+
+    stale = cd.discover_stale_hosts([tmp_path], "203.0.113.8")
+    assert stale == [(tracked.resolve(), "kc.192.0.2.4.nip.io")]
+
+
 def test_resolve_ingress_ip_explicit():
     assert cd.resolve_ingress_ip(cd.DEFAULT_SERVICE, "198.51.100.5", None) == "198.51.100.5"
 
 
 def test_resolve_ingress_ip_requires_address(monkeypatch):
-    monkeypatch.setattr(cd, "run_kubectl_jsonpath", lambda *args, **kwargs: "")
-    with pytest.raises(RuntimeError):
+    monkeypatch.setattr(
+        cd, "run_kubectl_json", lambda *args, **kwargs: {"spec": {"type": "LoadBalancer"}}
+    )
+    with pytest.raises(RuntimeError) as excinfo:
         cd.resolve_ingress_ip(cd.DEFAULT_SERVICE, None, None)
+    assert "Service type: LoadBalancer" in str(excinfo.value)
 
 
 def test_resolve_ingress_ip_prefers_latest_candidate(monkeypatch):
-    def fake_jsonpath(service: str, query: str) -> str:
-        if query == "{.status.loadBalancer.ingress[*].ip}":
-            return "198.51.100.7 203.0.113.10"
-        if query == "{.status.loadBalancer.ingress[*].hostname}":
-            return "old.example.com new.example.com"
-        return ""
-
-    monkeypatch.setattr(cd, "run_kubectl_jsonpath", fake_jsonpath)
+    calls = []
+
+    def fake_json(service: str) -> dict:
+        calls.append(service)
+        return {
+            "status": {
+                "loadBalancer": {
+                    "ingress": [
+                        {"ip": "198.51.100.7", "hostname": "old.example.com"},
+                        {"ip": "203.0.113.10", "hostname": "new.example.com"},
+                    ]
+                }
+            }
+        }
+
+    monkeypatch.setattr(cd, "run_kubectl_json", fake_json)
 
     assert cd.resolve_ingress_ip(cd.DEFAULT_SERVICE, None, None) == "203.0.113.10"
+    assert calls == [cd.DEFAULT_SERVICE]
+
+
+def test_resolve_ingress_ip_prefers_public_ipv4_from_hostname(monkeypatch):
+    resource = {"status": {"loadBalancer": {"ingress": [{"hostname": "lb.example.com"}]}}}
+    monkeypatch.setattr(cd, "run_kubectl_json", lambda service: resource)
+
+    def fake_getaddrinfo(host, port, family, proto):
+        assert host == "lb.example.com"
+        return [
+            (cd.socket.AF_INET, cd.socket.SOCK_STREAM, proto, "", ("10.0.0.4", 0)),
+            (cd.socket.AF_INET6, cd.socket.SOCK_STREAM, proto, "", ("2001:4860::1", 0, 0, 0)),
+            (cd.socket.AF_INET, cd.socket.SOCK_STREAM, proto, "", ("20.50.2.1", 0)),
+        ]
+
+    monkeypatch.setattr(cd.socket, "getaddrinfo", fake_getaddrinfo)
+
+    assert cd.resolve_ingress_ip(cd.DEFAULT_SERVICE, None, None) == "20.50.2.1"
+
+
+def test_resolve_ingress_ip_skips_ipv6_only_hostnames(monkeypatch):
+    entries = [{"ip": "2001:4860::1"}, {"hostname": "v6.example.com"}]
+    monkeypatch.setattr(
+        cd, "run_kubectl_json", lambda service: {"status": {"loadBalancer": {"ingress": entries}}}
+    )
+
+    def fake_getaddrinfo(host, port, family, proto):
+        assert family == cd.socket.AF_INET
+        if host == "v6.example.com":
+            raise cd.socket.gaierror(cd.socket.EAI_NONAME, "no A records")
+        return [(cd.socket.AF_INET, cd.socket.SOCK_STREAM, proto, "", ("20.50.2.1", 0))]
+
+    monkeypatch.setattr(cd.socket, "getaddrinfo", fake_getaddrinfo)
+
+    with pytest.raises(RuntimeError):
+        cd.resolve_ingress_ip(cd.DEFAULT_SERVICE, None, None)
+    assert cd.resolve_ingress_ip(cd.DEFAULT_SERVICE, None, "v4.example.com") == "20.50.2.1"
+
+
+def test_resolve_ingress_ip_looks_up_each_hostname_once(monkeypatch):
+    entries = [{"hostname": "lb.example.com"}, {"hostname": "lb.example.com"}]
+    monkeypatch.setattr(
+        cd, "run_kubectl_json", lambda service: {"status": {"loadBalancer": {"ingress": entries}}}
+    )
+    lookups = []
+
+    def fake_getaddrinfo(host, port, family, proto):
+        lookups.append(host)
+        raise OSError("no such host")
+
+    monkeypatch.setattr(cd.socket, "getaddrinfo", fake_getaddrinfo)
+
+    with pytest.raises(RuntimeError):
+        cd.resolve_ingress_ip(cd.DEFAULT_SERVICE, None, "lb.example.com")
+    assert lookups == ["lb.example.com"]
+
+
+@pytest.mark.parametrize(
+    "service, expected",
+    [
+        ("ingress-nginx/ingress-nginx-controller", ("ingress-nginx", "service/ingress-nginx-controller")),
+        ("ingress-nginx/svc/ingress-nginx-controller", ("ingress-nginx", "svc/ingress-nginx-controller")),
+    ],
+)
+def test_parse_ingress_service(service, expected):
+    assert cd.parse_ingress_service(service) == expected
 
 
 def test_run_kubectl_jsonpath_surfaces_failures(monkeypatch):
@@ -153,12 +270,6 @@ def test_run_kubectl_jsonpath_surfaces_failures(monkeypatch):
     assert "resource not found" in message
 
 
-def test_ensure_ingress_accessible_rejects_private_ip():
-    with pytest.raises(RuntimeError) as excinfo:
-        cd.ensure_ingress_accessible("10.0.0.4")
-    assert "non-public IP" in str(excinfo.value)
-
-
 def test_ensure_ingress_accessible_warns_when_skip_requested(capsys):
     # Documentation/test networks such as 203.0.113.0/24 are not globally
     # reachable but should still allow host rotation when operators opt out of
@@ -169,7 +280,14 @@ def test_ensure_ingress_accessible_warns_when_skip_requested(capsys):
     assert "203.0.113.7" in captured.err
 
 
-def test_ensure_ingress_accessible_requires_open_port(monkeypatch):
+@pytest.mark.parametrize(
+    "ip, fragment, probes_ports",
+    [
+        pytest.param("10.0.0.4", "non-public IP", False, id="private-ip"),
+        pytest.param("1.2.3.4", "Unable to reach", True, id="closed-ports"),
+    ],
+)
+def test_ensure_ingress_accessible_rejects(monkeypatch, ip, fragment, probes_ports):
     attempts = []
 
     def fake_create_connection(address, timeout):
@@ -179,7 +297,23 @@ def test_ensure_ingress_accessible_requires_open_port(monkeypatch):
     monkeypatch.setattr(cd.socket, "create_connection", fake_create_connection)
 
     with pytest.raises(RuntimeError) as excinfo:
-        cd.ensure_ingress_accessible("1.2.3.4")
+        cd.ensure_ingress_accessible(ip)
+
+    assert fragment in str(excinfo.value)
+    assert bool(attempts) is probes_ports
+
+
+def test_ensure_ingress_accessible_accepts_any_open_port(monkeypatch, capsys):
+    class FakeSocket:
+        def close(self):
+            pass
+
+    def fake_create_connection(address, timeout):
+        if address[1] == 80:
+            raise OSError("connection refused")
+        return FakeSocket()
+
+    monkeypatch.setattr(cd.socket, "create_connection", fake_create_connection)
 
-    assert "Unable to reach" in str(excinfo.value)
-    assert attempts
+    cd.ensure_ingress_accessible("1.2.3.4")
+    assert "port 443" in capsys.readouterr().out
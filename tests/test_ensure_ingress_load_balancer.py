@@ -0,0 +1,124 @@
+import pytest
+
+from scripts import ensure_ingress_load_balancer as eilb
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        [],
+        ["--ingress-service", "ingress-nginx/svc/custom", "--timeout=60"],
+        ["--resource-group=rg-demo", "--aks-name", "aks-demo", "--interval", "5"],
+    ],
+    ids=["defaults", "service-and-timeout", "azure-names"],
+)
+def test_parse_args_fast_path_matches_argparse(monkeypatch, argv):
+    monkeypatch.setenv("RESOURCE_GROUP", "rg-env")
+    monkeypatch.setenv("AKS_NAME", "aks-env")
+
+    fast = eilb.parse_args(argv)
+    monkeypatch.setattr(eilb, "_parse_known_flags", lambda args: None)
+    fallback = eilb.parse_args(argv)
+
+    assert fast == fallback
+
+
+def test_parse_args_falls_back_to_argparse_errors():
+    with pytest.raises(SystemExit):
+        eilb.parse_args(["--timeout", "soon"])
+
+
+def _completed(returncode=0, stdout="", stderr=""):
+    return eilb.subprocess.CompletedProcess([], returncode, stdout, stderr)
+
+
+def _stub_kubectl_wait(monkeypatch, proc):
+    calls = []
+
+    def fake_run_command(cmd, *, check=True):
+        calls.append(list(cmd))
+        return proc
+
+    monkeypatch.setattr(eilb, "_run_command", fake_run_command)
+    return calls
+
+
+def _stub_polling(monkeypatch, addresses):
+    queries = []
+
+    def fake_jsonpath(service, jsonpath):
+        queries.append(jsonpath)
+        return addresses.pop(0)
+
+    monkeypatch.setattr(eilb, "run_kubectl_jsonpath", fake_jsonpath)
+    monkeypatch.setattr(eilb.time, "sleep", lambda seconds: None)
+    return queries
+
+
+def test_wait_for_load_balancer_uses_kubectl_wait_address(monkeypatch, capsys):
+    calls = _stub_kubectl_wait(monkeypatch, _completed(stdout="20.50.2.1|"))
+    queries = _stub_polling(monkeypatch, [])
+
+    eilb._wait_for_load_balancer("ingress-nginx/ingress-nginx-controller", 60, 1)
+
+    assert calls == [
+        [
+            "kubectl",
+            "-n",
+            "ingress-nginx",
+            "wait",
+            "service/ingress-nginx-controller",
+            "--for=jsonpath={.status.loadBalancer.ingress}",
+            "--timeout=60s",
+            "-o",
+            f"jsonpath={eilb.LOAD_BALANCER_ADDRESS_JSONPATH}",
+        ]
+    ]
+    assert queries == []
+    assert "external IP 20.50.2.1" in capsys.readouterr().out
+
+
+def test_wait_for_load_balancer_polls_when_wait_reports_no_address(monkeypatch, capsys):
+    _stub_kubectl_wait(monkeypatch, _completed(stdout="|"))
+    queries = _stub_polling(monkeypatch, ["|", "|lb.example.com"])
+
+    eilb._wait_for_load_balancer("ingress-nginx/ingress-nginx-controller", 60, 1)
+
+    assert queries == [eilb.LOAD_BALANCER_ADDRESS_JSONPATH] * 2
+    assert "hostname lb.example.com" in capsys.readouterr().out
+
+
+def test_wait_for_load_balancer_stops_when_kubectl_wait_times_out(monkeypatch):
+    _stub_kubectl_wait(
+        monkeypatch,
+        _completed(returncode=1, stderr="error: timed out waiting for the condition on services/x"),
+    )
+    queries = _stub_polling(monkeypatch, [])
+
+    with pytest.raises(RuntimeError, match="Timed out"):
+        eilb._wait_for_load_balancer("ingress-nginx/ingress-nginx-controller", 60, 1)
+    assert queries == []
+
+
+def test_wait_for_load_balancer_polls_when_kubectl_lacks_jsonpath_conditions(monkeypatch, capsys):
+    _stub_kubectl_wait(
+        monkeypatch,
+        _completed(returncode=1, stderr='error: unrecognized condition: "jsonpath={.status.loadBalancer.ingress}"'),
+    )
+    queries = _stub_polling(monkeypatch, ["20.50.2.1|"])
+
+    eilb._wait_for_load_balancer("ingress-nginx/ingress-nginx-controller", 60, 1)
+
+    assert queries == [eilb.LOAD_BALANCER_ADDRESS_JSONPATH]
+    output = capsys.readouterr().out
+    assert "polling instead" in output
+    assert "external IP 20.50.2.1" in output
+
+
+def test_report_load_balancer_address_treats_kubectl_errors_as_pending(monkeypatch):
+    def failing_jsonpath(service, jsonpath):
+        raise eilb.KubectlError("services not found")
+
+    monkeypatch.setattr(eilb, "run_kubectl_jsonpath", failing_jsonpath)
+
+    assert eilb._report_load_balancer_address("ingress-nginx/ingress-nginx-controller") is False
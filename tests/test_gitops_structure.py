@@ -1,22 +1,32 @@
 from __future__ import annotations
 
-import pathlib
+import pytest
 
-import yaml
 
-REPO_ROOT = pathlib.Path(__file__).resolve().parents[1]
+def _replacement_index(kustomization) -> set[tuple[str, str, str, str]]:
+    return {
+        (
+            entry.get("source", {}).get("fieldPath"),
+            target.get("select", {}).get("kind"),
+            target.get("select", {}).get("name"),
+            field_path,
+        )
+        for entry in kustomization.get("replacements", [])
+        for target in entry.get("targets", [])
+        for field_path in target.get("fieldPaths", [])
+    }
 
 
-def load_yaml(path: pathlib.Path):
-    text = path.read_text(encoding="utf-8")
-    text = text.replace("values: |\n{{ toYaml .values | indent 12 }}\n", "values: {}\n")
-    if "\ntemplate:" in text:
-        text = text.split("\ntemplate:", 1)[0] + "\n"
-    return yaml.safe_load(text)
+def _argo_var_index(config) -> set[tuple[str, str]]:
+    return {
+        (item.get("kind"), item.get("path"))
+        for item in config["varReference"]
+        if item.get("group") == "argoproj.io"
+    }
 
 
-def test_platform_applicationset_versions():
-    manifest = load_yaml(REPO_ROOT / "gitops/clusters/aks/apps/platform-charts.applicationset.yaml")
+def test_platform_applicationset_versions(load_yaml):
+    manifest = load_yaml("gitops/clusters/aks/apps/platform-charts.applicationset.yaml")
     elements = manifest["spec"]["generators"][0]["list"]["elements"]
     assert {item["name"] for item in elements} == {"cert-manager", "cloudnative-pg", "ingress-nginx"}
 
@@ -26,133 +36,80 @@ def test_platform_applicationset_versions():
     assert indexed["ingress-nginx"]["targetRevision"] == "4.13.2"
 
 
-def test_iam_application_uses_placeholders():
-    app = load_yaml(REPO_ROOT / "gitops/clusters/aks/apps/iam.application.yaml")
+def test_iam_application_uses_placeholders(load_yaml):
+    app = load_yaml("gitops/clusters/aks/apps/iam.application.yaml")
     source = app["spec"]["source"]
     assert source["repoURL"] == "$(GITOPS_REPO_URL)"
     assert source["targetRevision"] == "$(GITOPS_TARGET_REVISION)"
     assert app["spec"]["syncPolicy"]["automated"]["prune"] is True
 
 
-def test_iam_application_repo_vars_are_kustomize_aware():
-    apps_dir = REPO_ROOT / "gitops/clusters/aks/apps"
-    kustomization = yaml.safe_load((apps_dir / "kustomization.yaml").read_text(encoding="utf-8"))
+def test_iam_application_repo_vars_are_kustomize_aware(load_yaml):
+    kustomization = load_yaml("gitops/clusters/aks/apps/kustomization.yaml")
     assert "configurations" in kustomization
     assert "kustomizeconfig.yaml" in kustomization["configurations"]
 
-    config = yaml.safe_load((apps_dir / "kustomizeconfig.yaml").read_text(encoding="utf-8"))
-    var_refs = config["varReference"]
-
-    def has_var(kind: str, path: str) -> bool:
-        return any(
-            item.get("kind") == kind
-            and item.get("path") == path
-            and item.get("group") == "argoproj.io"
-            for item in var_refs
-        )
+    config = load_yaml("gitops/clusters/aks/apps/kustomizeconfig.yaml")
+    var_refs = _argo_var_index(config)
 
-    assert has_var("Application", "spec/source/repoURL")
-    assert has_var("Application", "spec/source/targetRevision")
+    assert ("Application", "spec/source/repoURL") in var_refs
+    assert ("Application", "spec/source/targetRevision") in var_refs
 
 
-def test_iam_project_repo_var_is_kustomize_aware():
-    projects_dir = REPO_ROOT / "gitops/clusters/aks/projects"
-    kustomization = yaml.safe_load((REPO_ROOT / "gitops/clusters/aks/kustomization.yaml").read_text(encoding="utf-8"))
+def test_iam_project_repo_var_is_kustomize_aware(load_yaml):
+    kustomization = load_yaml("gitops/clusters/aks/kustomization.yaml")
     assert "configurations" in kustomization
     assert "kustomizeconfig/argocd-applications.yaml" in kustomization["configurations"]
 
-    config = yaml.safe_load(
-        (REPO_ROOT / "gitops/clusters/aks/kustomizeconfig/argocd-applications.yaml").read_text(encoding="utf-8")
-    )
-    var_refs = config["varReference"]
-
-    def has_var(kind: str, path: str) -> bool:
-        return any(
-            item.get("kind") == kind
-            and item.get("path") == path
-            and item.get("group") == "argoproj.io"
-            for item in var_refs
-        )
+    config = load_yaml("gitops/clusters/aks/kustomizeconfig/argocd-applications.yaml")
+    var_refs = _argo_var_index(config)
 
-    assert has_var("AppProject", "spec/sourceRepos")
+    assert ("AppProject", "spec/sourceRepos") in var_refs
 
-    project = load_yaml(projects_dir / "iam.yaml")
+    project = load_yaml("gitops/clusters/aks/projects/iam.yaml")
     assert "$(GITOPS_REPO_URL)" in project["spec"]["sourceRepos"]
 
 
-def test_params_env_defaults():
-    params = (REPO_ROOT / "gitops/apps/iam/params.env").read_text(encoding="utf-8")
-    assert "ingressClass=" in params
-    assert "keycloakHost=" in params
-    assert "midpointHost=" in params
-    assert "argocdHost=" in params
+def test_params_env_defaults(load_env):
+    params = load_env("gitops/apps/iam/params.env")
+    assert {"ingressClass", "keycloakHost", "midpointHost", "argocdHost"} <= params.keys()
 
 
-def test_iam_ingress_replacements_cover_all_targets():
-    kustomization = yaml.safe_load(
-        (REPO_ROOT / "gitops/apps/iam/kustomization.yaml").read_text(encoding="utf-8")
-    )
+def test_iam_ingress_replacements_cover_all_targets(load_yaml):
+    kustomization = load_yaml("gitops/apps/iam/kustomization.yaml")
+    replacements = _replacement_index(kustomization)
+
+    assert ("data.ingressClass", "Ingress", "keycloak", "spec.ingressClassName") in replacements
+    assert ("data.ingressClass", "Ingress", "midpoint", "spec.ingressClassName") in replacements
+    assert ("data.keycloakHost", "Keycloak", "rws-keycloak", "spec.hostname.hostname") in replacements
+    assert ("data.keycloakHost", "Ingress", "keycloak", "spec.rules.0.host") in replacements
+    assert ("data.midpointHost", "Ingress", "midpoint", "spec.rules.0.host") in replacements
 
-    def has_replacement(source_field: str, kind: str, name: str, field_path: str) -> bool:
-        for entry in kustomization.get("replacements", []):
-            src = entry.get("source", {})
-            if src.get("fieldPath") != source_field:
-                continue
-            for target in entry.get("targets", []):
-                selector = target.get("select", {})
-                if selector.get("kind") == kind and selector.get("name") == name:
-                    if field_path in target.get("fieldPaths", []):
-                        return True
-        return False
-
-    assert has_replacement("data.ingressClass", "Ingress", "keycloak", "spec.ingressClassName")
-    assert has_replacement("data.ingressClass", "Ingress", "midpoint", "spec.ingressClassName")
-    assert has_replacement("data.keycloakHost", "Keycloak", "rws-keycloak", "spec.hostname.hostname")
-    assert has_replacement("data.keycloakHost", "Ingress", "keycloak", "spec.rules.0.host")
-    assert has_replacement("data.midpointHost", "Ingress", "midpoint", "spec.rules.0.host")
-
-
-def test_bootstrap_ingress_replacements():
-    kustomization = yaml.safe_load(
-        (REPO_ROOT / "gitops/clusters/aks/bootstrap/kustomization.yaml").read_text(encoding="utf-8")
-    )
 
-    def has_replacement(source_field: str, kind: str, name: str, field_path: str) -> bool:
-        for entry in kustomization.get("replacements", []):
-            src = entry.get("source", {})
-            if src.get("fieldPath") != source_field:
-                continue
-            for target in entry.get("targets", []):
-                selector = target.get("select", {})
-                if selector.get("kind") == kind and selector.get("name") == name:
-                    if field_path in target.get("fieldPaths", []):
-                        return True
-        return False
-
-    assert has_replacement("data.ingressClass", "Ingress", "argocd-server", "spec.ingressClassName")
-    assert has_replacement("data.argocdHost", "Ingress", "argocd-server", "spec.rules.0.host")
-
-    ingress = load_yaml(REPO_ROOT / "gitops/clusters/aks/bootstrap/argocd-ingress.yaml")
+def test_bootstrap_ingress_replacements(load_yaml):
+    kustomization = load_yaml("gitops/clusters/aks/bootstrap/kustomization.yaml")
+    replacements = _replacement_index(kustomization)
+
+    assert ("data.ingressClass", "Ingress", "argocd-server", "spec.ingressClassName") in replacements
+    assert ("data.argocdHost", "Ingress", "argocd-server", "spec.rules.0.host") in replacements
+
+    ingress = load_yaml("gitops/clusters/aks/bootstrap/argocd-ingress.yaml")
     backend = (
         ingress["spec"]["rules"][0]["http"]["paths"][0]["backend"]["service"]
     )
     assert backend["port"].get("name") == "http"
 
 
-def test_iam_secret_generators_use_opaque_type():
-    kustomization = yaml.safe_load(
-        (REPO_ROOT / "gitops/apps/iam/secrets/kustomization.yaml").read_text(encoding="utf-8")
-    )
+def test_iam_secret_generators_use_opaque_type(load_yaml):
+    kustomization = load_yaml("gitops/apps/iam/secrets/kustomization.yaml")
     secrets = kustomization.get("secretGenerator", [])
     assert secrets, "secretGenerator entries should be defined for IAM secrets"
     for secret in secrets:
         assert secret.get("type") == "Opaque"
 
 
-def test_midpoint_env_requires_tls():
-    kustomization = yaml.safe_load(
-        (REPO_ROOT / "gitops/apps/iam/midpoint/kustomization.yaml").read_text(encoding="utf-8")
-    )
+def test_midpoint_env_requires_tls(load_yaml):
+    kustomization = load_yaml("gitops/apps/iam/midpoint/kustomization.yaml")
     generators = kustomization.get("configMapGenerator", [])
     midpoint_env = next((item for item in generators if item.get("name") == "midpoint-env"), None)
     assert midpoint_env is not None, "midpoint-env configMap generator must be defined"
@@ -160,8 +117,8 @@ def test_midpoint_env_requires_tls():
     assert "MIDPOINT_DB_SSLMODE=require" in literals
 
 
-def test_cnpg_cluster_handles_missing_crds_and_roles():
-    cluster = load_yaml(REPO_ROOT / "gitops/apps/iam/cnpg/cluster.yaml")
+def test_cnpg_cluster_handles_missing_crds_and_roles(load_yaml):
+    cluster = load_yaml("gitops/apps/iam/cnpg/cluster.yaml")
     annotations = cluster["metadata"].get("annotations", {})
     assert (
         annotations.get("argocd.argoproj.io/sync-options")
@@ -184,18 +141,18 @@ def test_cnpg_cluster_handles_missing_crds_and_roles():
     assert midpoint_secret.get("name") == "midpoint-db-app"
 
 
-def test_cnpg_databases_skip_dry_run():
-    for manifest_name in ("database-keycloak.yaml", "database-midpoint.yaml"):
-        manifest = load_yaml(REPO_ROOT / "gitops/apps/iam/cnpg" / manifest_name)
-        annotations = manifest["metadata"].get("annotations", {})
-        assert (
-            annotations.get("argocd.argoproj.io/sync-options")
-            == "SkipDryRunOnMissingResource=true"
-        ), f"{manifest_name} must skip dry-run until CNPG CRDs register"
+@pytest.mark.parametrize("manifest_name", ["database-keycloak.yaml", "database-midpoint.yaml"])
+def test_cnpg_databases_skip_dry_run(load_yaml, manifest_name):
+    manifest = load_yaml(f"gitops/apps/iam/cnpg/{manifest_name}")
+    annotations = manifest["metadata"].get("annotations", {})
+    assert (
+        annotations.get("argocd.argoproj.io/sync-options")
+        == "SkipDryRunOnMissingResource=true"
+    ), f"{manifest_name} must skip dry-run until CNPG CRDs register"
 
 
-def test_keycloak_resources_skip_dry_run_and_wave_ordering():
-    keycloak = load_yaml(REPO_ROOT / "gitops/apps/iam/keycloak/keycloak.yaml")
+def test_keycloak_resources_skip_dry_run_and_wave_ordering(load_yaml):
+    keycloak = load_yaml("gitops/apps/iam/keycloak/keycloak.yaml")
     keycloak_annotations = keycloak["metadata"].get("annotations", {})
     assert (
         keycloak_annotations.get("argocd.argoproj.io/sync-options")
@@ -209,7 +166,7 @@ def test_keycloak_resources_skip_dry_run_and_wave_ordering():
     ), "Keycloak must enable xforwarded proxy headers"
     assert options_by_name.get("proxy") == "edge", "Keycloak must run in edge proxy mode"
 
-    realm = load_yaml(REPO_ROOT / "gitops/apps/iam/keycloak/rws-realm.yaml")
+    realm = load_yaml("gitops/apps/iam/keycloak/rws-realm.yaml")
     realm_annotations = realm["metadata"].get("annotations", {})
     assert (
         realm_annotations.get("argocd.argoproj.io/sync-options")
@@ -1,21 +1,23 @@
+import base64
 import json
 
-from scripts.normalize_azure_storage_secret import parse_credential
+import pytest
 
+from scripts import normalize_azure_storage_secret as nass
+from scripts.normalize_azure_storage_secret import parse_args, parse_credential, render_secret
 
-def test_parse_account_key():
-    cred = parse_credential("ZmFrZUFjY291bnRLZXkxMjM0NTY=", "demoacct")
+
+@pytest.mark.parametrize(
+    "raw", ["ZmFrZUFjY291bnRLZXkxMjM0NTY=", '"ZmFrZUFjY291bnRLZXkxMjM0NTY="'], ids=["bare", "quoted"]
+)
+def test_parse_account_key(raw):
+    cred = parse_credential(raw, "demoacct")
     assert cred.storage_account == "demoacct"
     assert "AccountKey=ZmFrZUFjY291bnRLZXkxMjM0NTY=" in cred.connection_string
     assert cred.account_key == "ZmFrZUFjY291bnRLZXkxMjM0NTY="
     assert cred.sas_token is None
 
 
-def test_parse_account_key_with_quotes():
-    cred = parse_credential('"ZmFrZUFjY291bnRLZXkxMjM0NTY="', "demoacct")
-    assert cred.account_key == "ZmFrZUFjY291bnRLZXkxMjM0NTY="
-
-
 def test_parse_connection_string():
     raw = "DefaultEndpointsProtocol=https;AccountName=cnpgdemo;AccountKey=abcd;EndpointSuffix=core.windows.net"
     cred = parse_credential(raw, "ignored")
@@ -82,40 +84,73 @@ def test_parse_sas_url():
     assert "BlobEndpoint=https://cnpgdemo.blob.core.windows.net/" in cred.connection_string
 
 
-def test_parse_connection_string_json_wrapper():
-    raw = '{"connectionString": "DefaultEndpointsProtocol=https;AccountName=cnpgdemo;AccountKey=abcd;EndpointSuffix=core.windows.net"}'
-    cred = parse_credential(raw, "ignored")
-    assert cred.storage_account == "cnpgdemo"
-    assert cred.account_key == "abcd"
-
-
-def test_parse_key_list_json_wrapper():
-    raw = '[{"value": "ZmFrZUFjY291bnRLZXkxMjM0NTY="}]'
-    cred = parse_credential(raw, "demoacct")
-    assert cred.account_key == "ZmFrZUFjY291bnRLZXkxMjM0NTY="
-
-
-def test_parse_key_dict_with_keys_field():
-    raw = '{"keys": [{"value": "ZmFrZUFjY291bnRLZXkxMjM0NTY="}]}'
-    cred = parse_credential(raw, "demoacct")
-    assert cred.account_key == "ZmFrZUFjY291bnRLZXkxMjM0NTY="
-
-
-def test_parse_nested_json_wrappers():
-    raw = json.dumps(
-        {
-            "data": {
-                "properties": {
-                    "value": {
-                        "connectionString": "DefaultEndpointsProtocol=https;AccountName=cnpgdemo;AccountKey=abcd;EndpointSuffix=core.windows.net",
-                    }
-                }
-            }
-        }
-    )
-    cred = parse_credential(raw, "ignored")
-    assert cred.storage_account == "cnpgdemo"
-    assert cred.account_key == "abcd"
+CONNECTION_STRING = "DefaultEndpointsProtocol=https;AccountName=cnpgdemo;AccountKey=abcd;EndpointSuffix=core.windows.net"
+
+
+@pytest.mark.parametrize(
+    "raw, fallback, expected_account, expected_key",
+    [
+        pytest.param(
+            json.dumps({"connectionString": CONNECTION_STRING}), "ignored", "cnpgdemo", "abcd", id="connection-string"
+        ),
+        pytest.param(
+            '[{"value": "ZmFrZUFjY291bnRLZXkxMjM0NTY="}]',
+            "demoacct",
+            "demoacct",
+            "ZmFrZUFjY291bnRLZXkxMjM0NTY=",
+            id="key-list",
+        ),
+        pytest.param(
+            '{"keys": [{"value": "ZmFrZUFjY291bnRLZXkxMjM0NTY="}]}',
+            "demoacct",
+            "demoacct",
+            "ZmFrZUFjY291bnRLZXkxMjM0NTY=",
+            id="keys-field",
+        ),
+        pytest.param(
+            json.dumps({"data": {"properties": {"value": {"connectionString": CONNECTION_STRING}}}}),
+            "ignored",
+            "cnpgdemo",
+            "abcd",
+            id="nested",
+        ),
+    ],
+)
+def test_parse_json_wrappers(raw, fallback, expected_account, expected_key):
+    cred = parse_credential(raw, fallback)
+    assert cred.storage_account == expected_account
+    assert cred.account_key == expected_key
+
+
+ACCOUNT_KEY = base64.b64encode(bytes(range(64))).decode()
+
+
+@pytest.fixture(params=["stdlib", "orjson"])
+def json_decode(request, monkeypatch):
+    if request.param == "orjson":
+        decode = pytest.importorskip("orjson").loads
+    else:
+        decode = nass.STDLIB_JSON_DECODE
+    monkeypatch.setattr(nass, "JSON_DECODE", decode)
+    return decode
+
+
+@pytest.mark.parametrize(
+    "raw, expected_account, expected_key",
+    [
+        pytest.param(json.dumps({"connectionString": CONNECTION_STRING}), "cnpgdemo", "abcd", id="plain"),
+        pytest.param('{"AccountKey": "%s", "x": NaN}' % ACCOUNT_KEY, "acct", ACCOUNT_KEY, id="nan"),
+        pytest.param(
+            '{"AccountKey": "%s", "x": "\\ud800"}' % ACCOUNT_KEY, "acct", ACCOUNT_KEY, id="lone-surrogate"
+        ),
+    ],
+)
+def test_parse_json_wrappers_match_across_decoders(json_decode, monkeypatch, raw, expected_account, expected_key):
+    cred = parse_credential(raw, "acct")
+    assert (cred.storage_account, cred.account_key) == (expected_account, expected_key)
+
+    monkeypatch.setattr(nass, "JSON_DECODE", nass.STDLIB_JSON_DECODE)
+    assert parse_credential(raw, "acct") == cred
 
 
 def test_parse_development_storage_connection_string():
@@ -144,3 +179,26 @@ def test_parse_short_account_key_without_delimiters():
     assert cred.storage_account == "demoacct"
     assert cred.account_key == raw
     assert f"AccountKey={raw}" in cred.connection_string
+
+
+def test_render_secret_matches_kubectl_layout():
+    cred = parse_credential("ZmFrZUFjY291bnRLZXkxMjM0NTY=", "demoacct")
+    manifest = json.loads(render_secret("iam", cred))
+    assert manifest["kind"] == "Secret"
+    assert manifest["type"] == "Opaque"
+    assert manifest["metadata"] == {"name": "cnpg-azure-backup", "namespace": "iam"}
+    decoded = {key: base64.b64decode(val).decode("utf-8") for key, val in manifest["data"].items()}
+    assert decoded["AZURE_STORAGE_ACCOUNT"] == "demoacct"
+    assert decoded["AZURE_STORAGE_KEY"] == "ZmFrZUFjY291bnRLZXkxMjM0NTY="
+    assert decoded["AZURE_CONNECTION_STRING"] == cred.connection_string
+    assert "AZURE_STORAGE_SAS_TOKEN" not in decoded
+
+
+def test_parse_args_accepts_both_flag_forms():
+    options = parse_args(["--namespace", "iam", "--storage-account=demoacct", "--credential", "a=b;c"])
+    assert (options.namespace, options.storage_account, options.credential) == ("iam", "demoacct", "a=b;c")
+
+
+def test_parse_args_falls_back_to_argparse_errors():
+    with pytest.raises(SystemExit):
+        parse_args(["--namespace", "iam"])